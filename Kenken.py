@@ -1,23 +1,25 @@
 "KenKen.py"
-import numpy as np
 import pickle
-import time
 import pandas as pd
-from typing import List, Tuple, Dict, Union, Callable, Optional
+from typing import List, Tuple, Dict, Union, Optional
 import csp
+from domains import BitsetDomain
+from cache import DOMAIN_CACHE
+from parsing import parse_puzzle, PuzzleValidationError
 
 # @ <component>: <usage>
 
-# @ stderr: reporting errors
 # @ stdin: receiving input
-from sys import stderr, stdin
+from sys import stdin
 
 # @ product: creation of the variables' domains
 # @ permutations: determine the satisfiability of an operation
-from itertools import product, permutations
+# @ combinations: enumerate the naked subsets of a row / column
+from itertools import product, permutations, combinations
 
 # @ reduce: determine the result of an operation
-from functools import reduce
+# @ partial: bind options of the inference routines
+from functools import reduce, partial
 
 # @ seed: seed the pseudorandom number generator
 # @ random, shuffle, randint, choice: generate a random kenken puzzle
@@ -27,6 +29,8 @@ ELEMENT_TYPE: type = int or str
 CELL_TYPE: type = Tuple[ELEMENT_TYPE, ELEMENT_TYPE]
 
 ALGORITHMS = ["BT", "FC", "ARC"]
+
+
 def operation(operator):
     """
     A utility function used in order to determine the operation corresponding
@@ -155,30 +159,12 @@ def parse(lines):
     """
     Used in order to parse a non-generated / handmade kenken puzzle
     given in string / list of strings format
+      * The first line holds the size of the board, every other line a
+        clique such as (((1, 1), (1, 2)), '+', 11)
+      * Malformed input raises parsing.PuzzleParseError; see
+        parsing.iter_puzzles to read corpora of many puzzles
     """
-
-    if isinstance(lines, str):
-        lines = lines.splitlines(True)
-
-    try:
-        content = lines[0][:-1]
-        size = int(content)
-    except:
-        print("Unable to determine board size [", content, "]", file=stderr)
-        exit(11)
-
-    cliques = []
-    for line in lines[1:]:
-        content = line[:-1]
-        if content:
-            try:
-                clique = eval(content)
-                cliques.append(clique)
-            except:
-                print("Malformed clique [", content, "]")
-                exit(12)
-
-    return size, cliques
+    return parse_puzzle(lines)
 
 
 def validate(size, cliques):
@@ -190,6 +176,7 @@ def validate(size, cliques):
         * Check if any of the members of the clique are out of bounds
         * Check if any member of the clique is mentioned in any other clique
       * Check if the given cliques cover the whole board or not
+    Raises parsing.PuzzleValidationError on the first problem found
     """
     def outOfBounds(
         xy): return xy[0] < 1 or xy[0] > size or xy[1] < 1 or xy[1] > size
@@ -203,21 +190,18 @@ def validate(size, cliques):
         members, operator, target = cliques[i]
 
         if operator not in "+-*/.":
-            print("Operation", operator, "of clique",
-                  cliques[i], "is unacceptable", file=stderr)
-            exit(1)
+            raise PuzzleValidationError(
+                "Operation %r is unacceptable" % (operator,), 1, cliques[i])
 
         problematic = list(filter(outOfBounds, members))
         if problematic:
-            print("Members", problematic, "of clique",
-                  cliques[i], "are out of bounds", file=stderr)
-            exit(2)
+            raise PuzzleValidationError(
+                "Members are out of bounds", 2, cliques[i], problematic)
 
         problematic = mentioned.intersection(set(members))
         if problematic:
-            print("Members", problematic, "of clique",
-                  cliques[i], "are cross referenced", file=stderr)
-            exit(3)
+            raise PuzzleValidationError(
+                "Members are cross referenced", 3, cliques[i], problematic)
 
         mentioned.update(set(members))
 
@@ -227,9 +211,8 @@ def validate(size, cliques):
                       for y in indexes for x in indexes]).difference(mentioned)
 
     if problematic:
-        print("Positions", problematic,
-              "were not mentioned in any clique", file=stderr)
-        exit(4)
+        raise PuzzleValidationError(
+            "Positions were not mentioned in any clique", 4, cells=problematic)
 
 
 def RowXorCol(xy1, xy2):
@@ -274,64 +257,148 @@ def satisfies(values, operation, target):
     return False
 
 
-def gdomains(size, cliques):
+def cage_domain(size, members, operator, target):
     """
-    @ https://docs.python.org/2/library/itertools.html
-    @ product('ABCD', repeat=2) = [AA AB AC AD BA BB BC BD CA CB CC CD DA DB DC DD]
+    Construct, in the order 'product' would list them, the values of one
+    clique that 'satisfy' its operation without the members 'conflicting'
+    with each other:
+      * '.' : the target itself, if it fits on the board
+      * '+' : bounded compositions of the target, every prefix leaving a
+              remainder that the remaining members can still sum up to
+      * '*' : divisor chains of the target, every prefix leaving a
+              remainder that the remaining members can still multiply up to
+      * '-' and '/' on two members: the pairs that satisfy it directly
+    While a value is being built, a member is never given the value of an
+    earlier member it is 'RowXorCol' with. Any other combination falls back
+    to filtering the full 'product'.
+    """
+    count = len(members)
+    earlier = [[j for j in range(i) if RowXorCol(members[i], members[j])]
+               for i in range(count)]
 
-    For every clique in cliques:
-        * Initialize the domain of each variable to contain every product
-        of the set [1...board-size] that are of length 'clique-size'.
-        For example:
+    def free(values, v):
+        return all(values[j] != v for j in earlier[len(values)])
 
-            board-size = 3 and clique-size = 2
+    if operator == '.' and count == 1:
+        return [(target, )] if target in range(1, size + 1) else []
 
-            products = [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3), (3, 1), (3, 2), (3, 3)]
+    if operator in "-/" and count == 2:
+        operate = operation(operator)
+        return [(a, b) for a in range(1, size + 1) for b in range(1, size + 1)
+                if free((a, ), b) and satisfies((a, b), operate, target)]
 
-        * Discard any value (assignment of the members of the clique) that:
-        * is resulting in the members of the clique 'conflicting' with each other
-        * does not 'satisfy' the given operation
+    if operator not in "+*":
+        def qualifies(values): return not conflicting(
+            members, values, members, values) and satisfies(values, operation(operator), target)
+
+        return list(filter(qualifies, product(range(1, size + 1), repeat=count)))
+
+    domain = []
+
+    def extend(values, remainder):
+        left = count - len(values) - 1
+        if left < 0:
+            if remainder == (0 if operator == '+' else 1):
+                domain.append(tuple(values))
+            return
+        for v in range(1, size + 1):
+            if operator == '+':
+                rest = remainder - v
+                if rest < left or rest > left * size:
+                    continue
+            else:
+                if remainder % v:
+                    continue
+                rest = remainder // v
+                if rest > size ** left or (left == 0 and rest != 1):
+                    continue
+            if free(values, v):
+                values.append(v)
+                extend(values, rest)
+                values.pop()
+
+    extend([], target)
+    return domain
+
+
+def gdomains(size, cliques, cache=DOMAIN_CACHE):
+    """
+    For every clique in cliques, its domain is every assignment of values
+    in [1...board-size] to its members that:
+        * does not result in the members of the clique 'conflicting' with each other
+        * does 'satisfy' the given operation
+
+    The values are built directly by 'cage_domain' rather than by filtering
+    the whole product('1..size', repeat=clique-size), which costs
+    O(size ** clique-size * clique-size!) per clique on large boards.
+
+    Domains are looked up in 'cache' (a cache.DomainCache, process-wide by
+    default) by the shape of the clique, so cliques repeated across puzzles
+    are only built once; pass cache=None to always build them.
     """
     domains = {}
     for clique in cliques:
         members, operator, target = clique
 
-        domains[members] = list(
-            product(range(1, size + 1), repeat=len(members)))
-
-        def qualifies(values): return not conflicting(
-            members, values, members, values) and satisfies(values, operation(operator), target)
-
-        domains[members] = list(filter(qualifies, domains[members]))
+        if cache is None:
+            domains[members] = cage_domain(size, members, operator, target)
+        else:
+            domains[members] = cache.domain(size, members, operator, target, cage_domain)
 
     return domains
 
 
-def gneighbors(cliques):
+def ginteractions(cliques):
     """
-    Determine the neighbors of each variable for the given puzzle
-        For every clique in cliques
-        * Initialize its neighborhood as empty
-        * For every clique in cliques other than the clique at hand,
-            if they are probable to 'conflict' they are considered neighbors
+    Determine which variables of the given puzzle interact, and through
+    which members, in a single pass over a row -> members and a
+    column -> members index:
+        * every pair of members of different cliques found in the same row
+          or the same column is 'RowXorCol' (two distinct cells cannot share
+          both), so it makes the two cliques neighbors
+        * overlaps[(A, B)] collects the index pairs (i, j) of those members,
+          sorted, so that constraint checks can reuse them
+    The neighbors of a clique are listed in the order of cliques.
     """
-    neighbors = {}
+    order = {members: k for k, (members, _, _) in enumerate(cliques)}
+
+    rows = {}
+    cols = {}
     for members, _, _ in cliques:
-        neighbors[members] = []
+        for i, (x, y) in enumerate(members):
+            rows.setdefault(y, []).append((members, i))
+            cols.setdefault(x, []).append((members, i))
+
+    pairs = {}
+    for line in list(rows.values()) + list(cols.values()):
+        for A, i in line:
+            for B, j in line:
+                if A != B:
+                    pairs.setdefault((A, B), set()).add((i, j))
+
+    neighbors = {members: [] for members, _, _ in cliques}
+    for A, B in pairs:
+        neighbors[A].append(B)
+    for members in neighbors:
+        neighbors[members].sort(key=order.get)
+
+    overlaps = {key: tuple(sorted(value)) for key, value in pairs.items()}
+
+    return neighbors, overlaps
 
-    for A, _, _ in cliques:
-        for B, _, _ in cliques:
-            if A != B and B not in neighbors[A]:
-                if conflicting(A, [-1] * len(A), B, [-1] * len(B)):
-                    neighbors[A].append(B)
-                    neighbors[B].append(A)
 
-    return neighbors
+def gneighbors(cliques):
+    """
+    Determine the neighbors of each variable for the given puzzle:
+    two cliques are neighbors if they are probable to 'conflict',
+    see 'ginteractions'
+    """
+    return ginteractions(cliques)[0]
 
 
 class Kenken(csp.CSP):
 
-    def __init__(self, size, cliques):
+    def __init__(self, size, cliques, domain_store="bitset", cache=DOMAIN_CACHE):
         """
         In my implementation, I consider the cliques themselves as variables.
         A clique is of the format (((X1, Y1), ..., (XN, YN)), <operation>, <target>)
@@ -340,16 +407,22 @@ class Kenken(csp.CSP):
             * <operation> is either addition, subtraction, division or multiplication
             * <target> is the value that the <operation> should produce
               when applied on the members of the clique
+
+        The cage domains run to thousands of tuples on large boards, so by
+        default the current domains are kept as bitsets (see domains.py);
+        pass domain_store="list" for the plain list representation.
+        The domains are looked up in cache, see 'gdomains'.
         """
         validate(size, cliques)
 
         variables = [members for members, _, _ in cliques]
 
-        domains = gdomains(size, cliques)
+        domains = gdomains(size, cliques, cache)
 
-        neighbors = gneighbors(cliques)
+        neighbors, overlaps = ginteractions(cliques)
 
-        csp.CSP.__init__(self, variables, domains, neighbors, self.constraint)
+        csp.CSP.__init__(self, variables, domains, neighbors, self.constraint,
+                         domain_store=domain_store)
 
         self.size = size
 
@@ -364,6 +437,44 @@ class Kenken(csp.CSP):
             self.meta[members] = (operator, target)
             self.padding = max(self.padding, len(str(target)))
 
+        # Used in constraint checks
+        self.overlaps = overlaps
+        self.value_masks = {}
+        self.compatibility = {}
+        self.compile_constraints()
+
+        # Used in row / column reasoning: every row and column as a list of
+        # (members, index) pairs locating its cells inside the variables
+        self.lines = []
+        for i in range(1, size + 1):
+            self.lines.append([(members, members.index(m)) for members in variables
+                               for m in members if m[1] == i])
+            self.lines.append([(members, members.index(m)) for members in variables
+                               for m in members if m[0] == i])
+
+    def compile_constraints(self):
+        """
+        Precompute the tables behind 'constraint' and 'conflict_mask', which
+        are fixed once the cliques are known. overlaps[(A, B)], the member
+        index pairs (i, j) of two neighboring variables such that A[i] and
+        B[j] are 'RowXorCol', comes from 'ginteractions'; from it:
+          * value_masks[B][j][v] is the bitset, over the positions of
+            domains[B], of the values of B whose j-th member equals v
+          * compatibility[(A, B)] pairs every overlapping index i of A with
+            the value masks of its counterpart in B, so that the values of B
+            ruled out by A=a are the union of compatibility[(A, B)][k][1][a[i]]
+        """
+        for B in self.variables:
+            masks = [[0] * (self.size + 1) for _ in B]
+            for bit, values in enumerate(self.domains[B]):
+                for j, v in enumerate(values):
+                    masks[j][v] |= 1 << bit
+            self.value_masks[B] = masks
+
+        for (A, B), pairs in self.overlaps.items():
+            self.compatibility[(A, B)] = tuple(
+                (i, self.value_masks[B][j]) for i, j in pairs)
+
     # def nconflicts(self, var, val, assignment):
 
     # def assign(self, var, val, assignment):
@@ -379,7 +490,73 @@ class Kenken(csp.CSP):
         """
         self.checks += 1
 
-        return A == B or not conflicting(A, a, B, b)
+        if A == B:
+            return True
+
+        for i, j in self.overlaps.get((A, B), ()):
+            if a[i] == b[j]:
+                return False
+
+        return True
+
+    def conflict_mask(self, A, a, B):
+        """
+        The values of B that 'conflict' with A=a, as a bitset over the
+        positions of domains[B], looked up from the compiled tables
+        """
+        self.checks += 1
+
+        mask = 0
+        for i, masks in self.compatibility.get((A, B), ()):
+            mask |= masks[a[i]]
+
+        return mask
+
+    def candidates(self, cages):
+        """
+        Project the current domains of the given cages onto their cells:
+        the result maps every member (X, Y) to a bitset with bit v set when
+        some live value of its cage gives it the value v
+        """
+        self.support_pruning()
+        result = {}
+        for members in cages:
+            domain = self.curr_domains[members]
+            if isinstance(domain, BitsetDomain):
+                for i, masks in enumerate(self.value_masks[members]):
+                    bits = 0
+                    for v in range(1, self.size + 1):
+                        if masks[v] & domain.mask:
+                            bits |= 1 << v
+                    result[members[i]] = bits
+            else:
+                bits = [0] * len(members)
+                for values in domain:
+                    for i, v in enumerate(values):
+                        bits[i] |= 1 << v
+                for i, member in enumerate(members):
+                    result[member] = bits[i]
+        return result
+
+    def exclude(self, members, i, values, removals):
+        """
+        Prune the values of the cage 'members' that give its i-th member
+        one of the values set in the bitset 'values'. Returns whether
+        anything was pruned.
+        """
+        domain = self.curr_domains[members]
+        if isinstance(domain, BitsetDomain):
+            dead = 0
+            masks = self.value_masks[members][i]
+            for v in range(1, self.size + 1):
+                if values >> v & 1:
+                    dead |= masks[v]
+            dead = domain.values_of(domain.mask & dead)
+        else:
+            dead = [a for a in domain if values >> a[i] & 1]
+        for a in dead:
+            self.prune(members, a, removals)
+        return len(dead) > 0
 
     def display(self, assignment):
         """
@@ -457,10 +634,100 @@ class Kenken(csp.CSP):
         for var in self.variables:
             print("neighbors[", var, "] =", self.neighbors[var])
 
+def line_reasoning(ken, line, candidates, removals):
+    """
+    Apply to one row / column, given as (members, index) pairs:
+      * hidden singles: a value that only one cell of the line can still
+        take must be taken by that cell
+      * naked subsets: when k cells (k = 1, 2, 3) of the line can only take
+        k values between them, no other cell of the line can take those
+    Every conclusion is pushed back as prunes of cage values.
+    Returns None if the line can no longer be completed, otherwise the list
+    of cages that lost values (empty when nothing was learned).
+    """
+    full = sum(1 << v for v in range(1, ken.size + 1))
+    cells = [members[i] for members, i in line]
+
+    for v in range(1, ken.size + 1):
+        holders = [k for k, cell in enumerate(cells) if candidates[cell] >> v & 1]
+        if not holders:
+            return None
+        if len(holders) == 1:
+            members, i = line[holders[0]]
+            if candidates[cells[holders[0]]] != 1 << v:
+                ken.exclude(members, i, full & ~(1 << v), removals)
+                return [members]
+
+    for k in (1, 2, 3):
+        for subset in combinations(range(len(line)), k):
+            union = 0
+            for j in subset:
+                union |= candidates[cells[j]]
+            size = bin(union).count("1")
+            if size < k:
+                return None
+            if size > k:
+                continue
+            changed = []
+            for j, (members, i) in enumerate(line):
+                if j not in subset and candidates[cells[j]] & union:
+                    if ken.exclude(members, i, union, removals):
+                        changed.append(members)
+            if changed:
+                return changed
+
+    return []
+
+
+def row_column_inference(ken, var, value, assignment, removals):
+    """
+    Forward checking followed by row / column reasoning on the cells:
+    the live cage domains are projected onto per-cell candidate sets and
+    'line_reasoning' is applied to every row and column until no line
+    teaches anything new. Fails as soon as a cage domain runs empty.
+    """
+    if not csp.forward_checking(ken, var, value, assignment, removals):
+        return False
+
+    candidates = ken.candidates(ken.variables)
+    changed = True
+    while changed:
+        changed = False
+        for line in ken.lines:
+            cages = line_reasoning(ken, line, candidates, removals)
+            if cages is None:
+                return False
+            if cages:
+                for members in cages:
+                    if not ken.curr_domains[members]:
+                        return False
+                candidates.update(ken.candidates(cages))
+                changed = True
+
+    return True
+
+
+# inference routine used by solve() for each algorithm name
+INFERENCES = {
+    "Backtracking": csp.dummy_infer,
+    "Forward Checking": csp.forward_checking,
+    "Arc Consistency": partial(csp.mac, constraint_propagation=csp.AC2001),
+    "Row/Column Reasoning": row_column_inference,
+}
+
+
 def solve(
     size: int,
     cellAssignments: List[Tuple[Union[CELL_TYPE], str, ELEMENT_TYPE]],
-    algorithm: str,) ->\
+    algorithm: str,
+    domain_store: str = "bitset",
+    variable_order: Optional[str] = None,
+    value_order: str = "unordered",
+    engine: Optional[str] = None,
+    model: str = "cage",
+    backjumping: bool = False,
+    restarts: bool = False,
+    rseed: Optional[int] = None,) ->\
         Dict[Tuple[Union[CELL_TYPE]], ELEMENT_TYPE] or None:
     """
         Solve the Kenken puzzle with the given size and cell assignments
@@ -469,16 +736,93 @@ def solve(
         Args:
             size: the size of the puzzle
             cellAssignments: a list of cell assignments
-            algorithm: the algorithm to use
+            algorithm: the algorithm to use, one of the keys of INFERENCES
+            domain_store: "bitset" or "list", see csp.CSP
+            variable_order: "mrv" (the default) for incremental
+                minimum-remaining-values with degree tie-breaking, "first"
+                for the static order; not allowed with restarts
+            value_order: "lcv" for least-constraining-value ordering,
+                "unordered" to try the values in domain order
+            engine: "recursive" (the default) for csp.backtracking_search,
+                "iterative" for the explicit-stack csp.IterativeBacktracking
+            model: "cage" for one variable per clique (Kenken), "cell" for
+                one variable per cell with all-different rows and columns
+                (cellmodel.KenkenCells)
+            backjumping: search with conflict-directed backjumping, for
+                Backtracking (CBJ) and Forward Checking (FC-CBJ) with the
+                recursive engine
+            restarts: search with Luby restarts and dom/wdeg variable
+                selection (csp.restart_search), which always runs on the
+                recursive engine and picks its own variables, so it rejects
+                a variable_order and the iterative engine
+            rseed: the seed of the restart tie-breaking
+
+        Returns:
+            the solution, or None if the puzzle has none
+        Raises:
+            ValueError: an unknown option, or options that do not combine
+                (backjumping with Arc Consistency, Row/Column Reasoning,
+                the iterative engine or restarts; restarts with a
+                variable_order or the iterative engine)
     """
-    ken = Kenken(size, cellAssignments)
-    if algorithm == "Backtracking":
-        return csp.backtracking_search(ken)
-    if algorithm == "Forward Checking":
-        return csp.backtracking_search(ken, inference=csp.forward_checking)
-    if algorithm == "Arc Consistency":
-        return csp.backtracking_search(ken, inference=csp.mac)
-    return None
+    if model == "cell":
+        from cellmodel import KenkenCells, CELL_INFERENCES
+        inferences = CELL_INFERENCES
+    elif model == "cage":
+        inferences = INFERENCES
+    else:
+        raise ValueError("unknown model " + repr(model))
+    if algorithm not in inferences:
+        raise ValueError("unknown algorithm %r for the %s model" % (algorithm, model))
+    if restarts and variable_order is not None:
+        raise ValueError("restarts choose variables by dom/wdeg, variable_order "
+                         + repr(variable_order) + " would be ignored")
+    if restarts and engine == "iterative":
+        raise ValueError("restarts run on the recursive engine only")
+    variable_order = variable_order or "mrv"
+    engine = engine or "recursive"
+    if variable_order not in ("mrv", "first"):
+        raise ValueError("unknown variable order " + repr(variable_order))
+    if value_order not in ("lcv", "unordered"):
+        raise ValueError("unknown value order " + repr(value_order))
+    if engine not in ("recursive", "iterative"):
+        raise ValueError("unknown engine " + repr(engine))
+    if backjumping:
+        if algorithm not in ("Backtracking", "Forward Checking"):
+            raise ValueError("backjumping supports Backtracking and Forward Checking only")
+        if engine != "recursive" or restarts:
+            raise ValueError("backjumping needs the recursive engine without restarts")
+
+    if model == "cell":
+        ken = KenkenCells(size, cellAssignments, domain_store=domain_store)
+    else:
+        ken = Kenken(size, cellAssignments, domain_store=domain_store)
+    inference = inferences[algorithm]
+    if value_order == "lcv":
+        order = csp.LeastConstrainingValue()
+    else:
+        order = csp.unordered_domain_values
+    if restarts:
+        result = csp.restart_search(
+            ken, inference=inference, domainOrder=order, rseed=rseed)
+    else:
+        # built only here: an IncrementalMRV listens to the domains of ken
+        if variable_order == "mrv":
+            select = csp.IncrementalMRV(ken)
+        else:
+            select = csp.first_unassigned_variable
+        if engine == "iterative":
+            search = csp.IterativeBacktracking(
+                ken, chooseUnassignedVar=select, domainOrder=order, inference=inference)
+            search.run()
+            result = search.result
+        else:
+            result = csp.backtracking_search(
+                ken, chooseUnassignedVar=select, domainOrder=order,
+                inference=inference, trail=True, backjumping=backjumping)
+    if model == "cell":
+        return ken.to_cages(result)
+    return result
 
 
 def rename_axis(
@@ -506,80 +850,20 @@ def stats(
     iterations:int=50,
     start_size:int = 3,
     size_iteration:int = 10,
-    out_path = "Statistics.csv",**kargs):
+    out_path = "Benchmark.csv",**kargs):
     """
-        get the average results of the algorithms for various kenken puzzles
-        and save them in a csv file
+        Benchmark the algorithms on fixed seeded puzzles and save the median
+        solve times in a csv file, and every measure in a json file next to
+        it; see benchmark.run, which takes the other keyword arguments
+        (seed, timeout, max_nodes, memory, json_path...)
+        Statistics.csv holds the historical means of the old benchmark and
+        is not overwritten; history.History.import_csv loads it as a baseline.
 
         Args:
-            iterations: the number of iterations to average over
+            iterations: the total number of puzzles, size_iteration per size
             start_size: the size of the first kenken puzzle
+            size_iteration: the number of puzzles of each size
     """
-    # algos
-    def bt(ken): return csp.backtracking_search(ken)
-    def fc(ken): return csp.backtracking_search(
-        ken, inference=csp.forward_checking)
-
-    def mac(ken): return csp.backtracking_search(ken, inference=csp.mac)
-
-    # genration
-    def generate_board(
-            size: int):
-        """
-        Generate a random kenken puzzle of the given size
-
-        Args:
-            size: the size of the puzzle
-        """
-        _, cellAssignments = generate(size)
-        ken = Kenken(size, cellAssignments)
-        return ken
-
-    def algo_benchmark(
-            algo: Callable,
-            kenken: Kenken,):
-        t1 = time.perf_counter()
-        algo(kenken)
-        return time.perf_counter() - t1
-
-    def multi_algo_benchmark(
-            kenken: Kenken) -> Tuple[float, float, float]:
-
-        t1 = time.perf_counter()
-        bt(kenken)
-        bt_t = time.perf_counter() - t1
-
-        t1 = time.perf_counter()
-        fc(kenken)
-        fc_t = time.perf_counter() - t1
-
-        t1 = time.perf_counter()
-        mac(kenken)
-        mac_t = time.perf_counter() - t1
-
-        return [bt_t, fc_t, mac_t]
-
-    # generate boards
-    boards_df = pd.DataFrame()
-    for size in range(start_size, iterations//size_iteration+start_size):
-        boards_df[size-start_size] = list(map(lambda x: generate_board(size), range(size_iteration)))
-        print("generated for size", size)
-
-    print("generated")
-
-    # solve
-    results_df = pd.DataFrame()
-    for size in range(iterations//size_iteration):
-        print("Solving size", size+start_size)
-        y = np.array(list(map(
-                lambda ken: np.array(
-                    multi_algo_benchmark(ken)),
-                boards_df[size].to_list())
-            ))
-        results_df[size] = y.mean(axis=0)
-    # rename
-    results_df = rename_axis(results_df, col_accum=start_size)
-    # create algorithm column in the beginning
-    results_df.insert(
-        0, " ", ["Backtracking", "Forward Checking", "Arc Consistency"])
-    results_df.to_csv(out_path, index=0)
+    import benchmark
+    sizes = range(start_size, iterations//size_iteration+start_size)
+    return benchmark.run(sizes=sizes, count=size_iteration, out_path=out_path, **kargs)
@@ -184,7 +184,7 @@ class Ui_MainWindow(object):
             self.StatusBar_Message("blue", "Running Performance Analysis...", 10000)
             stats(iterations=100)
 
-            self.InfoDialog("Performance Analysis Completed, Please check the Statistics.csv file")
+            self.InfoDialog("Performance Analysis Completed, Please check the Benchmark.csv file")
             self.StatusBar_Message("green", "Performance Analysis Completed", 10000)
 
         return
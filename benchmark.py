@@ -0,0 +1,186 @@
+"""benchmark.py"""
+import csv
+import gc
+import json
+import time
+import tracemalloc
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import csp
+from Kenken import Kenken, INFERENCES
+from generator import PuzzleGenerator
+
+CELL_TYPE = Tuple[int, int]
+CAGE_TYPE = Tuple[Tuple[CELL_TYPE, ...], str, int]
+
+# the algorithms benchmarked by default, as named in Kenken.INFERENCES
+ALGORITHMS = ["Backtracking", "Forward Checking", "Arc Consistency"]
+# the per-solve measures that get summarized
+METRICS = ["wall", "cpu", "nodes", "checks", "prunes", "peak_memory"]
+
+
+def corpus(size: int, count: int, seed: int = 0, unique: bool = False) -> List[Tuple[int, List[CAGE_TYPE]]]:
+    """
+        The fixed benchmark corpus of a size: count puzzles of a
+        PuzzleGenerator seeded with seed + size, so every run and every
+        machine benchmarks the same puzzles
+    """
+    generator = PuzzleGenerator(size, seed=seed + size, unique=unique)
+    return [generator.puzzle() for _ in range(count)]
+
+
+def measure(
+    size: int,
+    cliques: List[CAGE_TYPE],
+    algorithm: str,
+    timeout: Optional[float] = None,
+    max_nodes: Optional[int] = None,
+    memory: bool = True) -> Dict[str, object]:
+    """
+        Solve one puzzle with one algorithm on a Kenken built for this solve
+        alone, so no state (curr_domains, counters) leaks between solves;
+        its domains are built without Kenken.DOMAIN_CACHE, so a solve does
+        not get cheaper because an earlier puzzle had the same cage shapes
+
+        The search is IterativeBacktracking with IncrementalMRV and the
+        inference of the algorithm, stopped after timeout seconds or
+        max_nodes nodes. Peak memory is taken with tracemalloc on a second,
+        identical solve, so that tracing does not slow down the timed one;
+        that solve has no deadline but stops at the node count the timed
+        one reached, so both cover the same search even when the timed one
+        ran out of time (tracing is several times slower).
+
+        Returns:
+            a record with the status ("solved", "failed", "timeout" or
+            "budget"), the wall and CPU seconds, nodes, constraint checks,
+            prunes and peak traced bytes (None when memory is False)
+    """
+    def run(max_nodes, timeout):
+        ken = Kenken(size, list(cliques), cache=None)
+        search = csp.IterativeBacktracking(ken, csp.IncrementalMRV(ken),
+                                           inference=INFERENCES[algorithm])
+        wall, cpu = time.perf_counter(), time.process_time()
+        deadline = None if timeout is None else wall + timeout
+        status = search.run(max_nodes=max_nodes, deadline=deadline)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if status == "paused":
+            status = "budget" if max_nodes is not None and search.nodes >= max_nodes else "timeout"
+        return {"status": status, "wall": wall, "cpu": cpu, "nodes": search.nodes,
+                "checks": ken.checks, "prunes": ken.nprunes}
+
+    record = run(max_nodes, timeout)
+    record["peak_memory"] = None
+    if memory:
+        # collect the garbage of earlier solves first: a collection falling
+        # inside the traced solve would move its peak from run to run
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(record["nodes"], None)
+            record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return record
+
+
+def bootstrap(values: np.ndarray, q: float, resamples: int, rng: np.random.Generator,
+              level: float = 0.95) -> Tuple[float, float]:
+    """Percentile bootstrap confidence interval of the q-th percentile of values."""
+    picks = rng.integers(0, len(values), size=(resamples, len(values)))
+    estimates = np.percentile(values[picks], q, axis=1)
+    tail = (1 - level) / 2
+    return (float(np.quantile(estimates, tail)), float(np.quantile(estimates, 1 - tail)))
+
+
+def summarize(records: List[Dict[str, object]], resamples: int = 1000, seed: int = 0) -> Dict[str, object]:
+    """
+        Median, p90 and p99 of every metric over the records of one
+        (algorithm, size), each with a 95% bootstrap confidence interval.
+        Solves stopped by the timeout or node budget count with the values
+        they reached (so the statistics are lower bounds) and are counted
+        under "unfinished".
+    """
+    rng = np.random.default_rng(seed)
+    summary = {"runs": len(records),
+               "unfinished": sum(r["status"] in ("timeout", "budget") for r in records)}
+    for metric in METRICS:
+        values = np.array([r[metric] for r in records if r[metric] is not None], dtype=float)
+        if not len(values):
+            continue
+        summary[metric] = {}
+        for name, q in (("median", 50), ("p90", 90), ("p99", 99)):
+            summary[metric][name] = float(np.percentile(values, q))
+            summary[metric][name + "_ci"] = bootstrap(values, q, resamples, rng)
+    return summary
+
+
+def run(
+    sizes: Iterable[int] = range(3, 9),
+    count: int = 10,
+    algorithms: Optional[List[str]] = None,
+    seed: int = 0,
+    timeout: Optional[float] = 10.0,
+    max_nodes: Optional[int] = 1000000,
+    memory: bool = True,
+    out_path: Optional[str] = "Benchmark.csv",
+    json_path: Optional[str] = None,
+    resamples: int = 1000) -> Dict[str, object]:
+    """
+        Benchmark the algorithms over the fixed corpora of the given sizes
+
+        Args:
+            sizes: the board sizes
+            count: the number of puzzles per size
+            algorithms: names of Kenken.INFERENCES, ALGORITHMS by default
+            seed: the seed of the corpora (see corpus)
+            timeout: seconds allowed per solve
+            max_nodes: nodes allowed per solve
+            memory: also measure the peak memory of every solve
+            out_path: the CSV of median wall times, one row per algorithm and
+                one column per size, laid out as Statistics.csv; that file
+                holds the means of the old benchmark, kept as the baseline
+                of history.History.import_csv, so it is not the default
+            json_path: the JSON file of every record and summary, by default
+                out_path with a .json extension
+            resamples: the bootstrap resamples of the confidence intervals
+
+        Returns:
+            {"config", "records", "summaries"} as written to the JSON file
+    """
+    algorithms = algorithms or ALGORITHMS
+    sizes = list(sizes)
+    config = {"sizes": sizes, "count": count, "algorithms": algorithms, "seed": seed,
+              "timeout": timeout, "max_nodes": max_nodes, "memory": memory}
+    records, summaries = [], []
+    for size in sizes:
+        puzzles = corpus(size, count, seed)
+        for algorithm in algorithms:
+            batch = []
+            for index, (_, cliques) in enumerate(puzzles):
+                record = measure(size, cliques, algorithm, timeout, max_nodes, memory)
+                record.update({"algorithm": algorithm, "size": size, "puzzle": index})
+                batch.append(record)
+            records.extend(batch)
+            summary = summarize(batch, resamples, seed)
+            summary.update({"algorithm": algorithm, "size": size})
+            summaries.append(summary)
+            print("benchmarked", algorithm, "size", size)
+
+    results = {"config": config, "records": records, "summaries": summaries}
+
+    if out_path is not None:
+        with open(out_path, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow([" "] + sizes)
+            for algorithm in algorithms:
+                writer.writerow([algorithm] + [s["wall"]["median"] for s in summaries
+                                               if s["algorithm"] == algorithm])
+        if json_path is None:
+            json_path = out_path.rsplit(".", 1)[0] + ".json"
+    if json_path is not None:
+        with open(json_path, "w") as out:
+            json.dump(results, out, indent=1)
+
+    return results
@@ -0,0 +1,134 @@
+"""cache.py"""
+import shelve
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+CELL_TYPE = Tuple[int, int]
+
+
+def signature(
+    size: int,
+    members: Tuple[CELL_TYPE, ...],
+    operator: str,
+    target: int) -> Tuple[tuple, Tuple[CELL_TYPE, ...], Tuple[int, ...]]:
+    """
+        Canonical signature of a clique: two cliques of the same board size,
+        operation and target whose cells have the same shape up to a
+        translation have the same domain, up to the order of their members.
+
+        Args:
+            size: the size of the board
+            members: the cells of the clique
+            operator: the operation of the clique
+            target: the target of the clique
+        Returns:
+            (key, canonical members, permutation) where the canonical members
+            are sorted, key holds their offsets from the top-left corner of
+            the clique, and members[i] == canonical[permutation[i]]
+    """
+    canonical = tuple(sorted(members))
+    x0 = min(x for x, _ in canonical)
+    y0 = min(y for _, y in canonical)
+    offsets = tuple((x - x0, y - y0) for x, y in canonical)
+    position = {member: i for i, member in enumerate(canonical)}
+    permutation = tuple(position[member] for member in members)
+    return (size, operator, target, offsets), canonical, permutation
+
+
+class DomainCache():
+    """
+    Memoization of clique domains across puzzles.
+
+    Domains are stored once per canonical signature (see 'signature') in an
+    in-memory LRU of at most 'maxsize' entries. An optional persistent tier
+    (a shelve file) is consulted on memory misses and filled on builds, so
+    batch jobs can reuse the domains computed by earlier processes.
+    hits, disk_hits and misses count how lookups were served.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 4096,
+        path: Optional[str] = None):
+        """
+            Args:
+                maxsize: the number of signatures kept in memory
+                path: the file of the persistent tier, none by default
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.disk = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path is not None:
+            self.open(path)
+
+    def open(self, path: str):
+        """Attach (and create if needed) the persistent tier at path."""
+        self.close()
+        self.disk = shelve.open(path)
+
+    def close(self):
+        """Flush and detach the persistent tier."""
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    def clear(self):
+        """Drop the in-memory entries and reset the counters."""
+        self.entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "size": len(self.entries),
+                "maxsize": self.maxsize}
+
+    def remember(self, key: tuple, domain: tuple):
+        self.entries[key] = domain
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def domain(
+        self,
+        size: int,
+        members: Tuple[CELL_TYPE, ...],
+        operator: str,
+        target: int,
+        build: Callable[[int, Tuple[CELL_TYPE, ...], str, int], List[tuple]]) -> List[tuple]:
+        """
+            Return the domain of a clique, building it with
+            build(size, members, operator, target) only when no clique of the
+            same signature was seen before.
+
+            The domain is built for the canonical (sorted) member order and
+            mapped back to the order of 'members'; the values are returned
+            in lexicographic order, as 'build' would list them.
+        """
+        key, canonical, permutation = signature(size, members, operator, target)
+
+        domain = self.entries.get(key)
+        if domain is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            disk_key = repr(key)
+            if self.disk is not None and disk_key in self.disk:
+                self.disk_hits += 1
+                domain = self.disk[disk_key]
+            else:
+                self.misses += 1
+                domain = tuple(build(size, canonical, operator, target))
+                if self.disk is not None:
+                    self.disk[disk_key] = domain
+            self.remember(key, domain)
+
+        if permutation == tuple(range(len(members))):
+            return list(domain)
+        return sorted(tuple(values[p] for p in permutation) for values in domain)
+
+
+# shared by every puzzle built in this process
+DOMAIN_CACHE = DomainCache()
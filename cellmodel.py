@@ -0,0 +1,347 @@
+"""cellmodel.py"""
+import time
+import random
+from typing import Dict, Tuple
+
+import csp
+from Kenken import validate, gdomains, generate, Kenken, INFERENCES
+
+
+class KenkenCells(csp.CSP):
+
+    def __init__(self, size, cliques, domain_store="bitset"):
+        """
+        Alternative model of the puzzle with one variable per cell.
+          * every cell (X, Y) takes a value in [1...size]
+          * every row and every column is an all-different constraint over
+            its cells, propagated as a whole by 'alldifferent' (Regin)
+          * every clique is a table constraint over its member cells, whose
+            allowed rows are the clique domain of the cage model (gdomains)
+        The binary 'constraint' only knows the pairwise part of these (two
+        cells of a line differ, two cells of a clique appear together in
+        some allowed row), so 'nconflicts' also checks the whole table once
+        a clique is completely assigned.
+        """
+        validate(size, cliques)
+
+        self.size = size
+        self.cages = [members for members, _, _ in cliques]
+        self.tables = gdomains(size, cliques)
+        self.rows = {y: [(x, y) for x in range(1, size + 1)] for y in range(1, size + 1)}
+        self.cols = {x: [(x, y) for y in range(1, size + 1)] for x in range(1, size + 1)}
+
+        variables = [(x, y) for y in range(1, size + 1) for x in range(1, size + 1)]
+
+        self.cage_of = {}
+        self.position = {}
+        for members in self.cages:
+            for i, member in enumerate(members):
+                self.cage_of[member] = members
+                self.position[member] = i
+
+        # pairs of values that two members of a clique can take together
+        self.pair_support = {}
+        for members in self.cages:
+            table = self.tables[members]
+            for i, A in enumerate(members):
+                for j, B in enumerate(members):
+                    if i != j:
+                        self.pair_support[(A, B)] = set((t[i], t[j]) for t in table)
+            self.tables[members] = (table, set(table))
+
+        domains = {}
+        for members in self.cages:
+            table, _ = self.tables[members]
+            for i, member in enumerate(members):
+                domains[member] = sorted(set(t[i] for t in table))
+
+        neighbors = {}
+        for (x, y) in variables:
+            peers = [cell for cell in self.rows[y] + self.cols[x] if cell != (x, y)]
+            peers += [cell for cell in self.cage_of[(x, y)] if cell != (x, y) and cell not in peers]
+            neighbors[(x, y)] = peers
+
+        csp.CSP.__init__(self, variables, domains, neighbors, self.constraint,
+                         domain_store=domain_store)
+
+        # Used in benchmarking
+        self.checks = 0
+
+    def constraint(self, A, a, B, b):
+        """
+        Two cells of the same row or column must differ, and two cells of
+        the same clique must take values that some allowed row of the
+        clique table takes together
+        """
+        self.checks += 1
+
+        if (A[0] == B[0]) != (A[1] == B[1]) and a == b:
+            return False
+
+        support = self.pair_support.get((A, B))
+        return support is None or (a, b) in support
+
+    def nconflicts(self, var, val, assignment):
+        """
+        The pairwise conflicts of var=val, plus one if this assignment
+        completes its clique with a row missing from the clique table
+        """
+        conflicts = csp.CSP.nconflicts(self, var, val, assignment)
+
+        members = self.cage_of[var]
+        if all(m in assignment or m == var for m in members):
+            row = tuple(val if m == var else assignment[m] for m in members)
+            if row not in self.tables[members][1]:
+                conflicts += 1
+
+        return conflicts
+
+    def to_cages(self, assignment):
+        """
+        Convert a cell assignment {(X, Y): value} to the cage model format
+        {members: values} used by the GUI and helpers.Convert_Cages
+        """
+        if assignment is None:
+            return None
+        return {members: tuple(assignment[m] for m in members) for members in self.cages}
+
+
+# -------------------------------------------------------------------------------------
+
+def max_matching(variables, domains):
+    """
+    Maximum matching of the bipartite variable/value graph, with augmenting
+    paths (Kuhn). Returns a dict {var: value} covering as many variables as
+    possible.
+    """
+    match_value = {}
+    match_var = {}
+
+    def augment(var, seen):
+        for value in domains[var]:
+            if value in seen:
+                continue
+            seen.add(value)
+            if value not in match_value or augment(match_value[value], seen):
+                match_value[value] = var
+                match_var[var] = value
+                return True
+        return False
+
+    for var in variables:
+        augment(var, set())
+
+    return match_var
+
+
+def strongly_connected(nodes, edges):
+    """
+    Tarjan's algorithm. edges is a dict {node: [successor, ...]}; returns a
+    dict {node: component id}.
+    """
+    index = {}
+    low = {}
+    component = {}
+    stack = []
+    on_stack = set()
+    counter = [0]
+
+    def visit(node):
+        index[node] = low[node] = counter[0]
+        counter[0] += 1
+        stack.append(node)
+        on_stack.add(node)
+        for succ in edges.get(node, ()):
+            if succ not in index:
+                visit(succ)
+                low[node] = min(low[node], low[succ])
+            elif succ in on_stack:
+                low[node] = min(low[node], index[succ])
+        if low[node] == index[node]:
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component[member] = node
+                if member == node:
+                    break
+
+    for node in nodes:
+        if node not in index:
+            visit(node)
+
+    return component
+
+
+def alldifferent(csp_var, variables, removals):
+    """
+    Matching-based filtering of an all-different constraint (Regin):
+      * find a maximum matching between the variables and their values;
+        fail if it does not cover every variable (pigeonhole)
+      * orient matching edges var -> value and the other edges value -> var
+      * an edge belongs to some maximum matching if it is a matching edge,
+        lies on a cycle (both ends in the same strongly connected component)
+        or can be reached from a value left free by the matching
+      * prune every other edge
+    Returns None on failure, otherwise the list of variables that lost values.
+    """
+    domains = {v: list(csp_var.curr_domains[v]) for v in variables}
+    matching = max_matching(variables, domains)
+    if len(matching) < len(variables):
+        return None
+
+    # nodes are ("x", var) and ("v", value) so that both kinds cannot clash
+    edges = {}
+    values = set()
+    for var in variables:
+        edges[("x", var)] = [("v", matching[var])]
+        for value in domains[var]:
+            values.add(value)
+            if value != matching[var]:
+                edges.setdefault(("v", value), []).append(("x", var))
+
+    matched = set(matching.values())
+    reached = set()
+    frontier = [("v", value) for value in values if value not in matched]
+    while frontier:
+        node = frontier.pop()
+        if node in reached:
+            continue
+        reached.add(node)
+        frontier.extend(edges.get(node, ()))
+
+    nodes = [("x", var) for var in variables] + [("v", value) for value in values]
+    component = strongly_connected(nodes, edges)
+
+    changed = []
+    for var in variables:
+        for value in domains[var]:
+            if value == matching[var]:
+                continue
+            if ("v", value) in reached or component[("v", value)] == component[("x", var)]:
+                continue
+            csp_var.prune(var, value, removals)
+            if var not in changed:
+                changed.append(var)
+
+    return changed
+
+
+def table(csp_var, members, removals):
+    """
+    Generalized arc consistency of a clique table: keep the rows whose every
+    value is still in the domain of its member and prune the member values
+    that no such row uses. Returns None on failure, otherwise the list of
+    members that lost values.
+    """
+    rows, _ = csp_var.tables[members]
+    domains = [csp_var.curr_domains[m] for m in members]
+    supported = [set() for _ in members]
+    for row in rows:
+        if all(row[i] in domains[i] for i in range(len(members))):
+            for i in range(len(members)):
+                supported[i].add(row[i])
+
+    changed = []
+    for i, member in enumerate(members):
+        for value in list(domains[i]):
+            if value not in supported[i]:
+                csp_var.prune(member, value, removals)
+                if member not in changed:
+                    changed.append(member)
+        if not domains[i]:
+            return None
+
+    return changed
+
+
+def regin(csp_var, var, value, assignment, removals):
+    """
+    Propagate the row, column and clique constraints touched by var=value,
+    and those touched by the resulting prunes, until nothing changes.
+    Rows and columns are filtered with 'alldifferent', cliques with 'table'.
+    """
+    csp_var.support_pruning()
+    pending = []
+    queued = set()
+
+    def touch(cell):
+        for key in (("row", cell[1]), ("col", cell[0]), ("cage", csp_var.cage_of[cell])):
+            if key not in queued:
+                queued.add(key)
+                pending.append(key)
+
+    touch(var)
+    while pending:
+        key = pending.pop()
+        queued.discard(key)
+        kind, which = key
+        if kind == "row":
+            changed = alldifferent(csp_var, csp_var.rows[which], removals)
+        elif kind == "col":
+            changed = alldifferent(csp_var, csp_var.cols[which], removals)
+        else:
+            changed = table(csp_var, which, removals)
+        if changed is None:
+            return False
+        for cell in changed:
+            if not csp_var.curr_domains[cell]:
+                return False
+            touch(cell)
+
+    return True
+
+
+# inference routine used by Kenken.solve() for each algorithm name
+CELL_INFERENCES = {
+    "Backtracking": csp.dummy_infer,
+    "Forward Checking": csp.forward_checking,
+    "Arc Consistency": regin,
+}
+
+
+# -------------------------------------------------------------------------------------
+
+def benchmark(
+    sizes=range(6, 13),
+    count: int = 5,
+    algorithm: str = "Arc Consistency",
+    timeout: float = 30.0,
+    rseed: int = 0) -> Dict[Tuple[str, int], Dict[str, float]]:
+    """
+        Compare the cage model (Kenken) and the cell model (KenkenCells) on
+        the same seeded random puzzles
+
+        Args:
+            sizes: the board sizes to benchmark
+            count: the number of puzzles per size
+            algorithm: the algorithm name, as in Kenken.solve
+            timeout: seconds allowed per solve; unfinished solves are counted
+                as timeouts and contribute the timeout to the mean
+            rseed: the seed of the puzzle generator
+
+        Returns:
+            a dict {(model, size): {"build", "search", "nodes", "timeouts"}}
+            with the mean build / search seconds and nodes per puzzle
+    """
+    results = {}
+    for size in sizes:
+        random.seed(rseed + size)
+        puzzles = [generate(size)[1] for _ in range(count)]
+        for model, build, inferences in (("cage", Kenken, INFERENCES),
+                                         ("cell", KenkenCells, CELL_INFERENCES)):
+            row = {"build": 0.0, "search": 0.0, "nodes": 0.0, "timeouts": 0}
+            for cliques in puzzles:
+                t0 = time.perf_counter()
+                problem = build(size, list(cliques))
+                t1 = time.perf_counter()
+                search = csp.IterativeBacktracking(
+                    problem, chooseUnassignedVar=csp.IncrementalMRV(problem),
+                    inference=inferences[algorithm])
+                if search.run(deadline=t1 + timeout) == "paused":
+                    row["timeouts"] += 1
+                row["build"] += (t1 - t0) / count
+                row["search"] += (time.perf_counter() - t1) / count
+                row["nodes"] += problem.nassigns / count
+            results[(model, size)] = row
+
+    return results
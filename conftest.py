@@ -0,0 +1,3 @@
+"""conftest.py"""
+# pytest loads this file from the repository root and so puts the root, where
+# the modules live, on sys.path for the tests in tests/
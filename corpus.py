@@ -0,0 +1,215 @@
+"""corpus.py"""
+import mmap
+import shutil
+import struct
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from Kenken import Kenken
+from parsing import iter_puzzles
+
+CELL_TYPE = Tuple[int, int]
+CAGE_TYPE = Tuple[Tuple[CELL_TYPE, ...], str, int]
+
+# Binary corpus layout, all little-endian:
+#   header   magic "KKCP", version (H), flags (H), count (Q), index offset (Q)
+#   records  one per puzzle, back to back:
+#              size (B), number of cages (H), then for every cage
+#              operator (B, index in OPERATORS), number of cells (B),
+#              target (i) and its cells (H each, (x - 1) * size + (y - 1));
+#              with FLAG_SOLUTIONS, size * size values (B) in row-major order
+#   index    the offset of every record (Q each), written last so that a
+#            corpus can be written as a stream
+MAGIC = b"KKCP"
+VERSION = 1
+FLAG_SOLUTIONS = 1
+OPERATORS = "+-*/."
+HEADER = struct.Struct("<4sHHQQ")
+RECORD = struct.Struct("<BH")
+CAGE = struct.Struct("<BBi")
+OFFSET = struct.Struct("<Q")
+
+
+def encode_puzzle(
+    size: int,
+    cliques: List[CAGE_TYPE],
+    solution: Optional[Dict[Tuple[CELL_TYPE, ...], tuple]] = None) -> bytes:
+    """
+        Pack one puzzle (and its solution, in the {members: values} form
+        returned by Kenken.solve) into a corpus record
+    """
+    if not 1 <= size <= 255:
+        raise ValueError("Board size %d does not fit in a corpus record" % size)
+    parts = [RECORD.pack(size, len(cliques))]
+    for members, operator, target in cliques:
+        if len(members) > 255:
+            raise ValueError("Clique %r has too many members" % (members,))
+        parts.append(CAGE.pack(OPERATORS.index(operator), len(members), target))
+        parts.append(struct.pack("<%dH" % len(members),
+                                 *((x - 1) * size + (y - 1) for x, y in members)))
+    if solution is not None:
+        grid = bytearray(size * size)
+        for members, values in solution.items():
+            for (x, y), value in zip(members, values):
+                grid[(y - 1) * size + (x - 1)] = value
+        parts.append(bytes(grid))
+    return b"".join(parts)
+
+
+def decode_puzzle(buffer, offset: int) -> Tuple[int, List[CAGE_TYPE], int]:
+    """
+        Unpack the record at offset of buffer (bytes, mmap or memoryview)
+        without copying it. Returns (size, cliques, offset of what follows
+        the cages, i.e. the solution grid if the corpus has one).
+    """
+    size, count = RECORD.unpack_from(buffer, offset)
+    offset += RECORD.size
+    cliques = []
+    for _ in range(count):
+        operator, length, target = CAGE.unpack_from(buffer, offset)
+        offset += CAGE.size
+        cells = struct.unpack_from("<%dH" % length, buffer, offset)
+        offset += 2 * length
+        members = tuple((cell // size + 1, cell % size + 1) for cell in cells)
+        cliques.append((members, OPERATORS[operator], target))
+    return size, cliques, offset
+
+
+class CorpusWriter():
+    """
+    Streams puzzles into a binary corpus file (layout above). Records are
+    written as they are added and their offsets go to a temporary file, so
+    memory does not grow with the corpus; close() appends that index and
+    fills in the header.
+    """
+
+    def __init__(self, path: str, with_solutions: bool = False):
+        self.file = open(path, "wb")
+        self.flags = FLAG_SOLUTIONS if with_solutions else 0
+        self.index = tempfile.TemporaryFile()
+        self.count = 0
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.flags, 0, 0))
+
+    def add(self, size: int, cliques: List[CAGE_TYPE], solution: Optional[dict] = None):
+        """Append a puzzle; its solution is required by corpora that hold them."""
+        if self.flags & FLAG_SOLUTIONS and solution is None:
+            raise ValueError("This corpus stores a solution with every puzzle")
+        self.index.write(OFFSET.pack(self.file.tell()))
+        self.count += 1
+        self.file.write(encode_puzzle(size, cliques,
+                                      solution if self.flags & FLAG_SOLUTIONS else None))
+
+    def close(self):
+        if self.file.closed:
+            return
+        index = self.file.tell()
+        self.index.seek(0)
+        shutil.copyfileobj(self.index, self.file)
+        self.index.close()
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.flags, self.count, index))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CorpusReader():
+    """
+    Random access to a binary corpus through mmap: reader[i] decodes only
+    the i-th record, so opening and indexing cost nothing per puzzle stored.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.flags, self.count, self.index = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a version %d puzzle corpus" % (path, VERSION))
+
+    def offset(self, i: int) -> int:
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("puzzle index out of range")
+        return OFFSET.unpack_from(self.buffer, self.index + OFFSET.size * i)[0]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Tuple[int, List[CAGE_TYPE]]:
+        """The i-th puzzle as (size, cliques), as generate() returns it."""
+        size, cliques, _ = decode_puzzle(self.buffer, self.offset(i))
+        return size, cliques
+
+    def __iter__(self) -> Iterator[Tuple[int, List[CAGE_TYPE]]]:
+        for i in range(self.count):
+            yield self[i]
+
+    def solution(self, i: int) -> Optional[Dict[Tuple[CELL_TYPE, ...], tuple]]:
+        """The stored solution of the i-th puzzle, None if the corpus has none."""
+        if not self.flags & FLAG_SOLUTIONS:
+            return None
+        size, cliques, offset = decode_puzzle(self.buffer, self.offset(i))
+        grid = self.buffer[offset:offset + size * size]
+        return {members: tuple(grid[(y - 1) * size + (x - 1)] for x, y in members)
+                for members, _, _ in cliques}
+
+    def kenken(self, i: int, **options) -> Kenken:
+        """The i-th puzzle as a Kenken problem; options go to Kenken()."""
+        size, cliques = self[i]
+        return Kenken(size, cliques, **options)
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -------------------------------------------------------------------------------------
+
+def write_corpus(
+    path: str,
+    puzzles: Iterable[Tuple[int, List[CAGE_TYPE]]],
+    solutions: Optional[Iterable[dict]] = None) -> int:
+    """
+        Write (size, cliques) puzzles, e.g. from generate(), and optionally
+        their solutions to a binary corpus. Returns the number of puzzles.
+    """
+    with CorpusWriter(path, with_solutions=solutions is not None) as writer:
+        if solutions is None:
+            for size, cliques in puzzles:
+                writer.add(size, cliques)
+        else:
+            for (size, cliques), solution in zip(puzzles, solutions):
+                writer.add(size, cliques, solution)
+        return writer.count
+
+
+def from_text(lines: Iterable[str], path: str) -> int:
+    """
+        Convert a text corpus (see parsing.iter_puzzles) to a binary one.
+        Returns the number of puzzles.
+    """
+    return write_corpus(path, iter_puzzles(lines))
+
+
+def to_text(path: str) -> Iterator[str]:
+    """
+        The lines of the text form of a binary corpus, as Kenken.parse and
+        parsing.iter_puzzles read them
+    """
+    with CorpusReader(path) as reader:
+        for size, cliques in reader:
+            yield str(size)
+            for clique in cliques:
+                yield str(clique)
@@ -1,6 +1,10 @@
 """csp.py"""
+import time
+from collections import deque, namedtuple, OrderedDict
 from typing import Callable, List, Tuple, Dict
-from utilities import argmin_random_tie, count, first
+import random
+from utilities import argmin_random_tie, count, first, luby
+from domains import BitsetDomain, Trail, index_values
 import problem
 
 class CSP(problem.Problem):
@@ -29,14 +33,28 @@ class CSP(problem.Problem):
         unassign(var, a)        Do del a[var], plus other bookkeeping
         nconflicts(var, val, a) Return the number of other variables that
                                 conflict with var=val
+        conflict_mask(A, a, B)  Bitset of the values of B ruled out by A=a,
+                                when the problem compiles its constraints
         curr_domains[var]       Slot: remaining consistent values for var
                                 Used by constraint propagation routines.
+        domain_store            Slot: "list" keeps curr_domains as lists,
+                                "bitset" as BitsetDomain objects
     The following methods are used only by graph_search and tree_search:
         actions(state)          Return a list of actions
         result(state, action)   Return a successor of state
         goal_test(state)        Return true if all constraints satisfied
     The following are just for debugging purposes:
         nassigns                Slot: tracks the number of assignments made
+        trail_high_water        Slot: deepest trail used by the last search
+        nbackjumps              Slot: levels skipped by conflict-directed
+                                backjumping
+        nbacktracks             Slot: values undone after a failure
+        nprunes                 Slot: values ruled out by prune
+        weights                 Slot: dom/wdeg constraint weights, counted
+                                by record_wipeout once it is a dict
+        residues                Slot: last supports found by AC2001
+        domain_listener         Slot: object told about assignments and
+                                domain changes, e.g. an IncrementalMRV
         display(a)              Print a human-readable representation
     """
 
@@ -45,7 +63,8 @@ class CSP(problem.Problem):
         variables: List[str or int],
         domains: Dict[str, int],
         neighbors: Dict[str, List[str]],
-        constraints: Callable[[List, int, List, int], bool]):
+        constraints: Callable[[List, int, List, int], bool],
+        domain_store: str = "list"):
         """initialize a CSP problem
             Args:
                 variables: a list of variables
@@ -54,7 +73,11 @@ class CSP(problem.Problem):
                     the other variables that participate in constraints.
                     constraints: a function f(A, a, B, b) that returns true if neighbors
                     A, B satisfy the constraint when they have values A=a, B=b
+                domain_store: how curr_domains are stored, either "list"
+                    or "bitset"
         """
+        if domain_store not in ("list", "bitset"):
+            raise ValueError("unknown domain store " + repr(domain_store))
         variables = variables or list(domains.keys())
 
         self.variables = variables
@@ -63,7 +86,16 @@ class CSP(problem.Problem):
         self.constraints = constraints
         self.initial = tuple()
         self.curr_domains = None
+        self.domain_store = domain_store
+        self.domain_indexes = None
         self.nassigns = 0
+        self.trail_high_water = 0
+        self.nbackjumps = 0
+        self.nbacktracks = 0
+        self.nprunes = 0
+        self.weights = None
+        self.residues = None
+        self.domain_listener = None
 
     def assign(
         self,
@@ -79,6 +111,8 @@ class CSP(problem.Problem):
         """
         assignment[var] = val
         self.nassigns += 1
+        if self.domain_listener is not None:
+            self.domain_listener.assigned(var)
 
     def unassign(
         self,
@@ -94,6 +128,8 @@ class CSP(problem.Problem):
         """
         if var in assignment:
             del assignment[var]
+            if self.domain_listener is not None:
+                self.domain_listener.unassigned(var)
 
     def getassignment(
         self,
@@ -119,6 +155,31 @@ class CSP(problem.Problem):
                     not self.constraints(var, val, var2, self.getassignment(assignment,var2)))
         return count(conflict(v) for v in self.neighbors[var])
 
+    def conflict_mask(
+        self,
+        A: str or int,
+        a: str or int,
+        B: str or int) -> int or None:
+        """
+            Return the values of B that are inconsistent with A=a, as a bitset
+            over the positions of domains[B], or None when the problem keeps
+            no compiled constraint tables. Propagation routines use it to
+            prune BitsetDomain objects with a single mask operation.
+        """
+        return None
+
+    def record_wipeout(
+        self,
+        A: str or int,
+        B: str or int):
+        """
+            Called by the propagation routines when the constraint between A
+            and B empties a domain; bumps its weight when weights are kept.
+        """
+        if self.weights is not None:
+            key = frozenset((A, B))
+            self.weights[key] = self.weights.get(key, 1) + 1
+
     def display(
         self,
         assignment: Dict[str, int]):
@@ -181,7 +242,15 @@ class CSP(problem.Problem):
     def support_pruning(self):
         # Make sure we can prune values from domains.
         if self.curr_domains is None:
-            self.curr_domains = {v: list(self.domains[v]) for v in self.variables}
+            if self.domain_store == "bitset":
+                # index every static domain once, later copies share it
+                if self.domain_indexes is None:
+                    self.domain_indexes = {v: index_values(self.domains[v])
+                                           for v in self.variables}
+                self.curr_domains = {v: BitsetDomain(self.domains[v], self.domain_indexes[v])
+                                     for v in self.variables}
+            else:
+                self.curr_domains = {v: list(self.domains[v]) for v in self.variables}
 
     def prune(self, var, value, removals):
         """Rule out var=value."""
@@ -189,21 +258,40 @@ class CSP(problem.Problem):
         params
             var: a variable
             value: a value
-            removals: a list of (var, val) pairs"""
+            removals: a list of (var, val) pairs or a Trail"""
         self.curr_domains[var].remove(value)
+        self.nprunes += 1
+        if self.domain_listener is not None:
+            self.domain_listener.domain_changed(var)
         if removals is not None:
-            removals.append((var, value))
-    def suppose(self, var, value):
+            if type(removals) is Trail:
+                removals.push(var, value)
+            else:
+                removals.append((var, value))
+    def suppose(self, var, value, trail=None):
         # Start accumulating inferences from assuming var=value
         """
         params: var: a variable
                 value: a value
+                trail: when given, the removals are pushed onto this Trail
+                    under a new level mark and the trail is returned
+                    instead of a fresh list
         """
         # remove value from cage domain
         self.support_pruning()
-        removals = [(var, a) for a in self.curr_domains[var] if a != value]
+        if trail is not None:
+            trail.mark()
+            for a in self.curr_domains[var]:
+                if a != value:
+                    trail.push(var, a)
+            removals = trail
+        else:
+            removals = [(var, a) for a in self.curr_domains[var] if a != value]
         # assign value to cell
-        self.curr_domains[var] = [value]
+        if self.domain_store == "bitset":
+            self.curr_domains[var].restrict(value)
+        else:
+            self.curr_domains[var] = [value]
         return removals
 
     def infer_assignment(self):
@@ -223,8 +311,13 @@ class CSP(problem.Problem):
                 if self.nconflicts(var, current[var], current) > 0]
     def restore(self, removals):
         """Undo a supposition and all inferences from it."""
+        if type(removals) is Trail:
+            removals.undo(self.curr_domains, self.domain_listener)
+            return
         for B, b in removals:
             self.curr_domains[B].append(b)
+            if self.domain_listener is not None:
+                self.domain_listener.domain_changed(B)
 
 
 
@@ -245,6 +338,7 @@ def AC3(csp_var, queue=None, removals=None):
         # remove all values from Xj domain that are not consistent with Xi
         if removeInconsistentValues(csp_var, Xi, Xj, removals):
             if not csp_var.curr_domains[Xi]:
+                csp_var.record_wipeout(Xi, Xj)
                 return False
             for Xk in csp_var.neighbors[Xi]:
                 if Xk != Xj:
@@ -262,15 +356,100 @@ def removeInconsistentValues(csp_var, Xi, Xj, removals):
             removals: list of arcs to be removed
     """
     removedVal = False
+    domain_j = csp_var.curr_domains[Xj]
+    bitset = type(domain_j) is BitsetDomain
     for x in csp_var.curr_domains[Xi][:]:
-        # If Xi=x conflicts with Xj=y for every possible y, eliminate Xi=x
-        if all(not csp_var.constraints(Xi, x, Xj, y) for y in csp_var.curr_domains[Xj]):
+        mask = csp_var.conflict_mask(Xi, x, Xj) if bitset else None
+        if mask is not None:
+            # Xi=x is supported as long as a live value of Xj survives its conflict mask
+            supported = domain_j.mask & ~mask
+        else:
+            # If Xi=x conflicts with Xj=y for every possible y, eliminate Xi=x
+            supported = any(csp_var.constraints(Xi, x, Xj, y) for y in domain_j)
+        if not supported:
             # prune Xi=x from domain Xj
             csp_var.prune(Xi, x, removals)
             removedVal = True
     return removedVal
 
 # -------------------------------------------------------------------------------------
+def AC2001(csp_var, queue=None, removals=None):
+    # arc consistency with residual supports (AC-3.1 / AC-2001, AC3rm variant)
+    """
+    Drop-in replacement for AC3 that
+      * remembers, for every arc (Xi, Xj) and value x of Xi, the last value of
+        Xj found to support Xi=x in csp_var.residues; a revision only searches
+        for a new support when that residue has been pruned
+      * keeps every arc at most once in the queue, so an arc that is already
+        waiting is not queued again
+    The residues are not restored on backtracking: a residue that is still
+    live is a valid support whatever happened in between, which is what makes
+    this variant suitable for MAC.
+
+    params: csp_var: CSP object
+            queue: list of arcs to be checked
+            removals: list of arcs to be removed
+    """
+    if queue is None:
+        queue = [(Xi, Xk) for Xi in csp_var.variables for Xk in csp_var.neighbors[Xi]]
+    csp_var.support_pruning()
+    if csp_var.residues is None:
+        csp_var.residues = {}
+    pending = deque()
+    queued = set()
+    for arc in queue:
+        if arc not in queued:
+            queued.add(arc)
+            pending.append(arc)
+    while pending:
+        arc = pending.popleft()
+        queued.discard(arc)
+        (Xi, Xj) = arc
+        if revise_with_residues(csp_var, Xi, Xj, removals):
+            if not csp_var.curr_domains[Xi]:
+                csp_var.record_wipeout(Xi, Xj)
+                return False
+            for Xk in csp_var.neighbors[Xi]:
+                if Xk != Xj and (Xk, Xi) not in queued:
+                    queued.add((Xk, Xi))
+                    pending.append((Xk, Xi))
+    return True
+
+# -------------------------------------------------------------------------------------
+
+def revise_with_residues(csp_var, Xi, Xj, removals):
+    # remove the values of Xi that have no support left in Xj's domain
+    """
+    params: csp_var: CSP object
+            Xi: variable
+            Xj: variable
+            removals: list of arcs to be removed
+    """
+    removedVal = False
+    residues = csp_var.residues.get((Xi, Xj))
+    if residues is None:
+        residues = csp_var.residues[(Xi, Xj)] = {}
+    domain_j = csp_var.curr_domains[Xj]
+    bitset = type(domain_j) is BitsetDomain
+    for x in csp_var.curr_domains[Xi][:]:
+        y = residues.get(x)
+        if y is not None and y in domain_j:
+            # the last support found is still alive
+            continue
+        mask = csp_var.conflict_mask(Xi, x, Xj) if bitset else None
+        if mask is not None:
+            live = domain_j.mask & ~mask
+            y = domain_j.values[(live & -live).bit_length() - 1] if live else None
+        else:
+            y = first(y for y in domain_j if csp_var.constraints(Xi, x, Xj, y))
+        if y is None:
+            csp_var.prune(Xi, x, removals)
+            removedVal = True
+        else:
+            residues[x] = y
+    return removedVal
+
+# -------------------------------------------------------------------------------------
 
 
 def first_unassigned_variable(assignment, constrain_search_problem_var):
@@ -308,6 +487,127 @@ def num_legal_values(constrain_search_problem_var, variable, assignment):
         return count(constrain_search_problem_var.nconflicts(variable, val, assignment) == 0
                      for val in constrain_search_problem_var.domains[variable])
 
+class IncrementalMRV():
+    """
+    Minimum-remaining-values variable selection backed by domain-size buckets.
+
+    Instead of rescanning every unassigned variable at each node, the
+    selector keeps the unassigned variables in buckets indexed by their
+    current domain size. It registers itself as the CSP's domain_listener, so
+    prune/restore move a variable between buckets and assign/unassign take it
+    out or put it back, each in O(1). Selection walks up from the smallest
+    non-empty bucket; ties are broken by degree (number of unassigned
+    neighbors, also kept incrementally), then by variable order, or at random
+    with the given rng.
+
+    An instance follows one search; create a new one for every search.
+    """
+
+    def __init__(self, constrain_search_problem_var, rng=None):
+        """
+        params:
+            constrain_search_problem_var: the problem
+            rng: a random.Random used to break ties between variables of equal
+                size and degree; ties are broken by variable order when omitted
+        """
+        constrain_search_problem_var.support_pruning()
+        domains = constrain_search_problem_var.curr_domains
+        self.neighbors = constrain_search_problem_var.neighbors
+        self.domains = domains
+        self.rng = rng
+        self.order = {v: i for i, v in enumerate(constrain_search_problem_var.variables)}
+        self.sizes = {v: len(domains[v]) for v in constrain_search_problem_var.variables}
+        self.buckets = [set() for _ in range(max(self.sizes.values(), default=0) + 1)]
+        for v, n in self.sizes.items():
+            self.buckets[n].add(v)
+        self.degrees = {v: len(self.neighbors[v]) for v in constrain_search_problem_var.variables}
+        self.assigned_vars = set()
+        self.low = 0
+        constrain_search_problem_var.domain_listener = self
+
+    def domain_changed(self, var):
+        """Move var to the bucket of its current domain size."""
+        if var in self.assigned_vars:
+            return
+        old, new = self.sizes[var], len(self.domains[var])
+        if old != new:
+            self.buckets[old].discard(var)
+            self.buckets[new].add(var)
+            self.sizes[var] = new
+            if new < self.low:
+                self.low = new
+
+    def assigned(self, var):
+        if var in self.assigned_vars:
+            return
+        self.assigned_vars.add(var)
+        self.buckets[self.sizes[var]].discard(var)
+        for n in self.neighbors[var]:
+            self.degrees[n] -= 1
+
+    def unassigned(self, var):
+        if var not in self.assigned_vars:
+            return
+        self.assigned_vars.discard(var)
+        for n in self.neighbors[var]:
+            self.degrees[n] += 1
+        new = len(self.domains[var])
+        self.sizes[var] = new
+        self.buckets[new].add(var)
+        if new < self.low:
+            self.low = new
+
+    def __call__(self, assignment, constrain_search_problem_var):
+        buckets = self.buckets
+        while self.low < len(buckets) and not buckets[self.low]:
+            self.low += 1
+        if self.low == len(buckets):
+            return None
+        bucket = buckets[self.low]
+        if len(bucket) == 1:
+            return next(iter(bucket))
+        degrees = self.degrees
+        if self.rng is None:
+            order = self.order
+            return min(bucket, key=lambda v: (-degrees[v], order[v]))
+        best = max(degrees[v] for v in bucket)
+        return argmin_random_tie(sorted((v for v in bucket if degrees[v] == best), key=self.order.get),
+                                 key=lambda v: 0, rng=self.rng)
+
+class DomWdeg():
+    """
+    dom/wdeg variable selection: pick the unassigned variable with the
+    smallest ratio of domain size to weighted degree, where the weighted
+    degree sums the weights of its constraints with unassigned neighbors.
+    Weights live in CSP.weights and are bumped by record_wipeout every time
+    a constraint empties a domain, so they survive restarts and steer the
+    search towards the variables that keep failing.
+    Ties are broken at random with rng.
+    """
+
+    def __init__(self, constrain_search_problem_var, rng=None):
+        """
+        params:
+            constrain_search_problem_var: the problem; its weights are
+                created if it keeps none yet
+            rng: a random.Random used to break ties
+        """
+        if constrain_search_problem_var.weights is None:
+            constrain_search_problem_var.weights = {}
+        self.rng = rng
+
+    def __call__(self, assignment, constrain_search_problem_var):
+        weights = constrain_search_problem_var.weights
+
+        def score(var):
+            wdeg = sum(weights.get(frozenset((var, n)), 1)
+                       for n in constrain_search_problem_var.neighbors[var] if n not in assignment)
+            return num_legal_values(constrain_search_problem_var, var, assignment) / max(wdeg, 1)
+
+        return argmin_random_tie(
+            [v for v in constrain_search_problem_var.variables if v not in assignment],
+            key=score, rng=self.rng)
+
 # Value ordering
 
 
@@ -318,6 +618,61 @@ def unordered_domain_values(var, assignment, constrain_search_problem_var):
     Choices_Of_Variable = constrain_search_problem_var.choices(var)
     return Choices_Of_Variable
 
+class LeastConstrainingValue():
+    """
+    Least-constraining-value ordering: try first the values that rule out
+    the fewest values in the domains of the unassigned neighbors.
+
+    With bitset domains and compiled constraints (see CSP.conflict_mask) the
+    number of values of B eliminated by var=a is the popcount of
+    curr_domains[B].mask & conflict_mask(var, a, B). For every (var, a, B)
+    the conflict mask, the mask of B it was counted against and the count
+    are cached; when B has only lost values since, the count is updated by
+    subtracting the popcount of the lost values that were in conflict,
+    instead of being recomputed. Other problems fall back to counting with
+    the constraint function.
+
+    Use an instance as the domainOrder of backtracking_search.
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def eliminated(self, constrain_search_problem_var, var, value, neighbor):
+        """The number of live values of neighbor ruled out by var=value."""
+        domain = constrain_search_problem_var.curr_domains[neighbor]
+        if type(domain) is not BitsetDomain:
+            return count(not constrain_search_problem_var.constraints(var, value, neighbor, b)
+                         for b in domain)
+        cache = self.cache.get((var, neighbor))
+        if cache is None:
+            cache = self.cache[(var, neighbor)] = {}
+        entry = cache.get(value)
+        live = domain.mask
+        if entry is None:
+            conflicts = constrain_search_problem_var.conflict_mask(var, value, neighbor)
+            if conflicts is None:
+                return count(not constrain_search_problem_var.constraints(var, value, neighbor, b)
+                             for b in domain)
+            entry = cache[value] = [conflicts, live, (live & conflicts).bit_count()]
+            return entry[2]
+        conflicts, seen, n = entry
+        if live != seen:
+            if live & ~seen:
+                # values came back since, count again
+                n = (live & conflicts).bit_count()
+            else:
+                n -= ((seen ^ live) & conflicts).bit_count()
+            entry[1], entry[2] = live, n
+        return n
+
+    def __call__(self, var, assignment, constrain_search_problem_var):
+        constrain_search_problem_var.support_pruning()
+        future = [n for n in constrain_search_problem_var.neighbors[var] if n not in assignment]
+        return sorted(constrain_search_problem_var.choices(var),
+                      key=lambda value: sum(self.eliminated(constrain_search_problem_var, var, value, n)
+                                            for n in future))
+
 def dummy_infer(*args): return True
 
 # Hossam #
@@ -328,27 +683,106 @@ def forward_checking(constrain_search_problem_var, var_value, value, assignment,
     while i != len(constrain_search_problem_var.neighbors[var_value]):
         currentVal = constrain_search_problem_var.neighbors[var_value][i]
         if currentVal not in assignment:
+            domain = constrain_search_problem_var.curr_domains[currentVal]
+            mask = None
+            if type(domain) is BitsetDomain:
+                mask = constrain_search_problem_var.conflict_mask(var_value, value, currentVal)
+            if mask is not None:
+                for b in domain.values_of(domain.mask & mask):
+                    constrain_search_problem_var.prune(currentVal, b, removals)
+                if not domain:
+                    constrain_search_problem_var.record_wipeout(var_value, currentVal)
+                    return False
+                i = i + 1
+                continue
             for b in constrain_search_problem_var.curr_domains[currentVal][:]:
                 if not constrain_search_problem_var.constraints(var_value, value, currentVal, b):
                     constrain_search_problem_var.prune(currentVal, b, removals)
             if not constrain_search_problem_var.curr_domains[currentVal]:
+                constrain_search_problem_var.record_wipeout(var_value, currentVal)
                 return False
         i = i + 1
     return True
 
 
 # Hossam #
-def mac(constrain_search_problem_var, var, value, assignment, removals):
-    """Maintain arc consistency."""
-    return AC3(constrain_search_problem_var, [(X, var) for X in constrain_search_problem_var.neighbors[var]], removals)
+def mac(constrain_search_problem_var, var, value, assignment, removals, constraint_propagation=AC3):
+    """Maintain arc consistency.
+
+    constraint_propagation is AC3 by default; bind it to AC2001 with
+    functools.partial to reuse residual supports across the search.
+    """
+    return constraint_propagation(constrain_search_problem_var, [(X, var) for X in constrain_search_problem_var.neighbors[var]], removals)
 
 # The search, proper
 
+def new_trail(constrain_search_problem_var):
+    """A Trail large enough for any search path over the problem."""
+    constrain_search_problem_var.support_pruning()
+    return Trail(
+        sum(len(constrain_search_problem_var.curr_domains[v])
+            for v in constrain_search_problem_var.variables),
+        len(constrain_search_problem_var.variables))
+
+class BudgetExceeded(Exception):
+    """Raised by backtracking_search when max_backtracks runs out."""
+
+
+def count_backtrack(constrain_search_problem_var, limit):
+    """Count one backtrack; raise BudgetExceeded past the limit, if any."""
+    constrain_search_problem_var.nbacktracks += 1
+    if limit is not None and constrain_search_problem_var.nbacktracks > limit:
+        raise BudgetExceeded(limit)
+
 # Hossam #
 def backtracking_search(constrain_search_problem_var,
                         chooseUnassignedVar=first_unassigned_variable,
                         domainOrder=unordered_domain_values,
-                        inference=dummy_infer):
+                        inference=dummy_infer,
+                        trail=False,
+                        backjumping=False,
+                        nogoods=None,
+                        max_backtracks=None):
+    """
+    params:
+        trail: if True, record removals on one preallocated Trail with level
+            marks instead of a fresh removals list per node; the deepest
+            trail size reached is stored in trail_high_water
+        backjumping: if True, search with conflict-directed backjumping
+            (CBJ, or FC-CBJ when inference is forward_checking); see
+            conflict_directed_backjumping
+        nogoods: a NogoodStore to learn nogoods into and to check values
+            against; learning uses the conflict sets of backjumping, so
+            passing a store turns backjumping on. The store can be passed to
+            later searches of the same problem (restarts, portfolios).
+        max_backtracks: raise BudgetExceeded after this many backtracks
+            (values undone after a failure); curr_domains is reset so the
+            problem can be searched again
+    The domain_listener (e.g. an IncrementalMRV) is detached when the
+    search ends, however it ends.
+    """
+    search_trail = new_trail(constrain_search_problem_var) if trail else None
+    limit = None
+    if max_backtracks is not None:
+        limit = constrain_search_problem_var.nbacktracks + max_backtracks
+
+    if backjumping or nogoods is not None:
+        if inference not in (dummy_infer, forward_checking):
+            raise ValueError("backjumping supports dummy_infer and forward_checking inference only")
+        try:
+            result = conflict_directed_backjumping(
+                constrain_search_problem_var, chooseUnassignedVar, domainOrder,
+                inference is forward_checking, search_trail, nogoods, limit)
+        except BudgetExceeded:
+            constrain_search_problem_var.curr_domains = None
+            raise
+        finally:
+            constrain_search_problem_var.domain_listener = None
+        if search_trail is not None:
+            constrain_search_problem_var.trail_high_water = search_trail.high_water
+        assert result is None or constrain_search_problem_var.goal_test(result)
+        return result
+
     def makeVackTrackFunction(assignment):
         if len(assignment) == len(constrain_search_problem_var.variables):
             return assignment
@@ -356,20 +790,482 @@ def backtracking_search(constrain_search_problem_var,
         for value in domainOrder(var, assignment, constrain_search_problem_var):
             if 0 == constrain_search_problem_var.nconflicts(var, value, assignment):
                 constrain_search_problem_var.assign(var, value, assignment)
-                removals = constrain_search_problem_var.suppose(var, value)
+                removals = constrain_search_problem_var.suppose(var, value, search_trail)
                 if inference(constrain_search_problem_var, var, value, assignment, removals):
                     result = makeVackTrackFunction(assignment)
                     if result is not None:
                         return result
                 constrain_search_problem_var.restore(removals)
+                count_backtrack(constrain_search_problem_var, limit)
         constrain_search_problem_var.unassign(var, assignment)
         return None
 
-    result = makeVackTrackFunction({})
+    try:
+        result = makeVackTrackFunction({})
+    except BudgetExceeded:
+        constrain_search_problem_var.curr_domains = None
+        raise
+    finally:
+        # the search is over: stop notifying its variable selector
+        constrain_search_problem_var.domain_listener = None
+    if search_trail is not None:
+        constrain_search_problem_var.trail_high_water = search_trail.high_water
     assert result is None or constrain_search_problem_var.goal_test(result)
     return result
 
 
+def conflict_directed_backjumping(constrain_search_problem_var,
+                                  chooseUnassignedVar=first_unassigned_variable,
+                                  domainOrder=unordered_domain_values,
+                                  forward_check=False,
+                                  search_trail=None,
+                                  nogoods=None,
+                                  limit=None):
+    """
+    Conflict-directed backjumping (Prosser's CBJ / FC-CBJ).
+
+    Every variable collects a conflict set: the past variables that are
+    responsible for ruling out its values.
+      * without forward checking, a value of var that conflicts with the
+        assignment blames the earliest assigned neighbor it conflicts with
+      * with forward checking, past_fc[B] lists the past variables that
+        pruned the domain of B; a wipe-out of B blames past_fc[B], and once
+        var runs out of values its own past_fc[var] is blamed as well
+      * when the problem overrides nconflicts with checks beyond the binary
+        constraints, a value it rejects blames every assigned neighbor
+    When var runs out of values, the search jumps straight back to the most
+    recent variable of its conflict set, and the variables in between are
+    abandoned without trying their other values. nassigns counts the nodes,
+    nbackjumps the levels skipped.
+
+    The assignment of the conflict set of an exhausted variable can never
+    be extended to a solution: with a NogoodStore it is recorded as a
+    nogood, and values that would complete a known nogood are rejected,
+    blaming the rest of that nogood, before they are even assigned.
+
+    params:
+        forward_check: prune the future neighbors of every assignment (FC-CBJ)
+        search_trail: a Trail for the removals, or None for lists
+        nogoods: a NogoodStore, or None
+        limit: raise BudgetExceeded once nbacktracks passes this value
+    """
+    problem = constrain_search_problem_var
+    problem.support_pruning()
+    level = {}
+    past_fc = {v: [] for v in problem.variables}
+    # problems that add non-binary checks to nconflicts (e.g. the clique
+    # tables of cellmodel.KenkenCells) are asked about every value as well
+    global_check = type(problem).nconflicts is not CSP.nconflicts
+
+    def forward(var, value, assignment, removals):
+        # prune the future neighbors, return (pruned neighbors, wiped-out neighbor)
+        touched = []
+        for B in problem.neighbors[var]:
+            if B in assignment:
+                continue
+            domain = problem.curr_domains[B]
+            mask = problem.conflict_mask(var, value, B) if type(domain) is BitsetDomain else None
+            if mask is not None:
+                dead = domain.values_of(domain.mask & mask)
+            else:
+                dead = [b for b in domain if not problem.constraints(var, value, B, b)]
+            if dead:
+                for b in dead:
+                    problem.prune(B, b, removals)
+                past_fc[B].append(var)
+                touched.append(B)
+                if not domain:
+                    problem.record_wipeout(var, B)
+                    return touched, B
+        return touched, None
+
+    def search(assignment):
+        if len(assignment) == len(problem.variables):
+            return assignment, None
+        var = chooseUnassignedVar(assignment, problem)
+        conflicts = set()
+        for value in list(domainOrder(var, assignment, problem)):
+            if not forward_check:
+                culprits = [v for v in problem.neighbors[var]
+                            if v in assignment and not problem.constraints(var, value, v, assignment[v])]
+                if culprits:
+                    conflicts.add(min(culprits, key=level.get))
+                    continue
+            if global_check and problem.nconflicts(var, value, assignment):
+                # no single culprit is known: blame every assigned neighbor
+                conflicts.update(v for v in problem.neighbors[var] if v in assignment)
+                continue
+            if nogoods is not None:
+                nogood = nogoods.check(var, value, assignment)
+                if nogood is not None:
+                    conflicts.update(v for v, _ in nogood if v != var)
+                    continue
+            problem.assign(var, value, assignment)
+            level[var] = len(assignment)
+            removals = problem.suppose(var, value, search_trail)
+            touched, wiped = forward(var, value, assignment, removals) if forward_check else ([], None)
+            if wiped is not None:
+                conflicts.update(v for v in past_fc[wiped] if v != var)
+                jump = None
+            else:
+                result, jump = search(assignment)
+                if result is not None:
+                    return result, None
+            for B in touched:
+                past_fc[B].pop()
+            problem.restore(removals)
+            problem.unassign(var, assignment)
+            del level[var]
+            count_backtrack(problem, limit)
+            if jump is not None:
+                if var not in jump:
+                    # var played no part in the failure below: jump over it
+                    problem.nbackjumps += 1
+                    return None, jump
+                conflicts.update(v for v in jump if v != var)
+        conflicts.update(past_fc[var])
+        if nogoods is not None:
+            nogoods.add((v, assignment[v]) for v in conflicts)
+        return None, conflicts
+
+    return search({})[0]
+
+
+class NogoodStore():
+    """
+    A bounded store of nogoods: sets of (var, value) pairs that were proven
+    not to hold together in any solution.
+
+    Nogoods are indexed by each of their pairs, so checking a candidate
+    var=value only looks at the nogoods that mention it. The store keeps at
+    most 'capacity' nogoods of at most 'max_length' pairs (short nogoods
+    prune more and are cheaper to check); when full, the least recently
+    learned or used nogood is evicted. learned, hits and evicted count the
+    store's activity.
+    """
+
+    def __init__(self, capacity=10000, max_length=8):
+        """
+        params:
+            capacity: the number of nogoods kept
+            max_length: longer nogoods are not recorded
+        """
+        self.capacity = capacity
+        self.max_length = max_length
+        self.nogoods = OrderedDict()
+        self.watches = {}
+        self.learned = 0
+        self.hits = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.nogoods)
+
+    def add(self, pairs):
+        """Record the nogood made of the given (var, value) pairs."""
+        nogood = frozenset(pairs)
+        if len(nogood) > self.max_length:
+            return
+        if nogood in self.nogoods:
+            self.nogoods.move_to_end(nogood)
+            return
+        self.nogoods[nogood] = None
+        for pair in nogood:
+            self.watches.setdefault(pair, set()).add(nogood)
+        self.learned += 1
+        while len(self.nogoods) > self.capacity:
+            old, _ = self.nogoods.popitem(last=False)
+            for pair in old:
+                self.watches[pair].discard(old)
+            self.evicted += 1
+
+    def check(self, var, value, assignment):
+        """
+        Return a nogood that var=value would complete under the given
+        assignment, or None.
+        """
+        for nogood in self.watches.get((var, value), ()):
+            if all(v == var or (v in assignment and assignment[v] == x) for v, x in nogood):
+                self.hits += 1
+                self.nogoods.move_to_end(nogood)
+                return nogood
+        return None
+
+
+def restart_search(constrain_search_problem_var,
+                   inference=forward_checking,
+                   domainOrder=unordered_domain_values,
+                   schedule="luby",
+                   base=100,
+                   factor=1.5,
+                   rseed=None,
+                   max_restarts=None,
+                   nogoods=None):
+    """
+    Backtracking search with randomized restarts.
+
+    Run i (from 1) may backtrack at most base * luby(i) times with the
+    "luby" schedule, or base * factor ** (i - 1) times with "geometric";
+    when it runs out, the search starts over from an empty assignment.
+    Variables are chosen by DomWdeg with ties broken by a random.Random
+    seeded with rseed, and the constraint weights it relies on carry over
+    from run to run, as does the NogoodStore when one is given (nogood
+    learning needs dummy_infer or forward_checking inference).
+
+    Returns the solution, or None if the problem was proven unsolvable or
+    max_restarts runs all ran out of budget; nrestarts is left on the
+    problem.
+    """
+    if schedule not in ("luby", "geometric"):
+        raise ValueError("unknown restart schedule " + repr(schedule))
+    rng = random.Random(rseed)
+    constrain_search_problem_var.nrestarts = 0
+    run = 1
+    while max_restarts is None or run <= max_restarts:
+        if schedule == "luby":
+            budget = base * luby(run)
+        else:
+            budget = int(base * factor ** (run - 1))
+        constrain_search_problem_var.curr_domains = None
+        try:
+            return backtracking_search(
+                constrain_search_problem_var,
+                chooseUnassignedVar=DomWdeg(constrain_search_problem_var, rng),
+                domainOrder=domainOrder, inference=inference, trail=True,
+                nogoods=nogoods, max_backtracks=budget)
+        except BudgetExceeded:
+            constrain_search_problem_var.nrestarts += 1
+            run += 1
+    return None
+
+
+# result of count_solutions: the number of solutions found (at most the
+# limit), the nodes (assignments) searched in total and after the first
+# solution, and whether the search ran to the end (False when it stopped
+# at the limit)
+SolutionCount = namedtuple("SolutionCount", "solutions nodes nodes_after_first exhausted")
+
+
+def count_solutions(constrain_search_problem_var,
+                    limit=None,
+                    chooseUnassignedVar=first_unassigned_variable,
+                    domainOrder=unordered_domain_values,
+                    inference=forward_checking,
+                    trail=True):
+    """
+    Count the solutions of the problem with the same search as
+    backtracking_search, which goes on after every solution instead of
+    returning it; no solution is copied out of the assignment.
+
+    params:
+        limit: stop as soon as this many solutions are found, e.g. 2 to
+            check that a puzzle has a unique solution; None counts them all
+        chooseUnassignedVar, domainOrder, inference: as in backtracking_search
+        trail: record removals on a preallocated Trail
+
+    Returns a SolutionCount; with limit=2 and two solutions found,
+    nodes_after_first is the work spent proving the solution is not unique.
+    The problem is left with every assignment undone and no domain_listener.
+    """
+    problem = constrain_search_problem_var
+    search_trail = new_trail(problem) if trail else None
+    problem.support_pruning()
+    start = problem.nassigns
+    found = [0, None]
+
+    def search(assignment):
+        if len(assignment) == len(problem.variables):
+            found[0] += 1
+            if found[1] is None:
+                found[1] = problem.nassigns
+            return limit is not None and found[0] >= limit
+        var = chooseUnassignedVar(assignment, problem)
+        stop = False
+        for value in domainOrder(var, assignment, problem):
+            if 0 == problem.nconflicts(var, value, assignment):
+                problem.assign(var, value, assignment)
+                removals = problem.suppose(var, value, search_trail)
+                if inference(problem, var, value, assignment, removals):
+                    stop = search(assignment)
+                problem.restore(removals)
+                if stop:
+                    break
+        problem.unassign(var, assignment)
+        return stop
+
+    try:
+        stopped = search({})
+    finally:
+        problem.domain_listener = None
+    nodes = problem.nassigns - start
+    after_first = 0 if found[1] is None else problem.nassigns - found[1]
+    return SolutionCount(found[0], nodes, after_first, not stopped)
+
+
+class IterativeBacktracking():
+    """
+    Explicit-stack counterpart of backtracking_search.
+
+    The search takes the same chooseUnassignedVar / domainOrder / inference
+    hooks, but keeps one frame [var, remaining values, removals] per level
+    on a list instead of a Python call frame. It never approaches the
+    recursion limit, and it can stop after any node and carry on later
+    from exactly that point:
+
+        engine = IterativeBacktracking(ken, inference=forward_checking)
+        while engine.run(max_nodes=1000) == "paused":
+            ...  # do something else, then resume
+
+    run() returns the status: "paused", "solved" or "failed". Once solved,
+    engine.result holds a copy of the solution; calling run() again resumes
+    after it and looks for the next one.
+
+    A search can also start below a prefix of (var, value) pairs, which
+    are imposed before the first node and never undone, and split() hands
+    over untried values as such prefixes; together they let several
+    engines share one search tree (see parallel.solve_parallel).
+    """
+
+    def __init__(self,
+                 constrain_search_problem_var,
+                 chooseUnassignedVar=first_unassigned_variable,
+                 domainOrder=unordered_domain_values,
+                 inference=dummy_infer,
+                 trail=True,
+                 prefix=()):
+        """
+        params:
+            constrain_search_problem_var: the problem
+            chooseUnassignedVar, domainOrder, inference: as in backtracking_search
+            trail: record removals on a preallocated Trail
+            prefix: (var, value) pairs to impose before searching
+        """
+        self.csp = constrain_search_problem_var
+        self.chooseUnassignedVar = chooseUnassignedVar
+        self.domainOrder = domainOrder
+        self.inference = inference
+        self.trail = new_trail(constrain_search_problem_var) if trail else None
+        self.assignment = {}
+        self.stack = []
+        self.started = False
+        self.status = "paused"
+        self.result = None
+        self.nodes = 0
+        self.prefix = list(prefix)
+        # a selector that listens to domain changes (IncrementalMRV) is
+        # attached to the problem only while run() searches
+        self.listener = None
+        if getattr(chooseUnassignedVar, "domain_changed", None) is not None:
+            self.listener = chooseUnassignedVar
+            if constrain_search_problem_var.domain_listener is chooseUnassignedVar:
+                constrain_search_problem_var.domain_listener = None
+
+    def start(self):
+        """
+        Impose the prefix and open the first frame; done by the first run().
+        Returns the status: "failed" if the prefix is inconsistent, "solved"
+        if it is already a complete assignment, otherwise "paused".
+        Called on its own, it leaves the selector attached as the problem's
+        domain_listener; run() detaches it.
+        """
+        self.started = True
+        problem, assignment = self.csp, self.assignment
+        problem.domain_listener = self.listener
+        problem.support_pruning()
+        for var, value in self.prefix:
+            if (var in assignment or value not in problem.curr_domains[var] or
+                    problem.nconflicts(var, value, assignment) != 0):
+                self.status = "failed"
+                return self.status
+            problem.assign(var, value, assignment)
+            removals = problem.suppose(var, value, self.trail)
+            if not self.inference(problem, var, value, assignment, removals):
+                self.status = "failed"
+                return self.status
+        if not self.push():
+            self.result = dict(assignment)
+            self.status = "solved"
+        return self.status
+
+    def split(self):
+        """
+        Take the untried values of the shallowest frame that has any away
+        from this search and return them as prefixes, one per value, that a
+        new IterativeBacktracking (on another copy of the problem) can
+        explore; returns [] when there is nothing left to give.
+        """
+        for depth, frame in enumerate(self.stack):
+            remaining = list(frame[1])
+            if remaining:
+                frame[1] = iter(())
+                path = self.prefix + [(f[0], self.assignment[f[0]]) for f in self.stack[:depth]]
+                return [path + [(frame[0], value)] for value in remaining]
+        return []
+
+    def push(self):
+        """Open a frame for the next variable, or report a complete assignment."""
+        if len(self.assignment) == len(self.csp.variables):
+            return False
+        var = self.chooseUnassignedVar(self.assignment, self.csp)
+        self.stack.append([var, iter(list(self.domainOrder(var, self.assignment, self.csp))), None])
+        return True
+
+    def run(self, max_nodes=None, deadline=None):
+        """
+        Search until a solution is found, the tree is exhausted, or a budget
+        runs out.
+
+        params:
+            max_nodes: pause after this many new assignments
+            deadline: pause once time.perf_counter() passes this value
+        """
+        if self.status == "failed":
+            return self.status
+        problem, assignment, stack = self.csp, self.assignment, self.stack
+        problem.domain_listener = self.listener
+        try:
+            if not self.started:
+                if self.start() != "paused":
+                    return self.status
+            nodes = 0
+            while stack:
+                frame = stack[-1]
+                var, values, removals = frame
+                if removals is not None:
+                    # undo the value tried last time this frame was on top
+                    frame[2] = None
+                    problem.restore(removals)
+                for value in values:
+                    if 0 == problem.nconflicts(var, value, assignment):
+                        problem.assign(var, value, assignment)
+                        removals = problem.suppose(var, value, self.trail)
+                        if self.inference(problem, var, value, assignment, removals):
+                            frame[2] = removals
+                            nodes += 1
+                            self.nodes += 1
+                            break
+                        problem.restore(removals)
+                else:
+                    problem.unassign(var, assignment)
+                    stack.pop()
+                    continue
+                if not self.push():
+                    self.result = dict(assignment)
+                    assert problem.goal_test(self.result)
+                    self.status = "solved"
+                    return self.status
+                if ((max_nodes is not None and nodes >= max_nodes) or
+                        (deadline is not None and time.perf_counter() >= deadline)):
+                    self.status = "paused"
+                    return self.status
+            if self.trail is not None:
+                problem.trail_high_water = self.trail.high_water
+            self.result = None
+            self.status = "failed"
+            return self.status
+        finally:
+            problem.domain_listener = None
+
 
 def setupFunction():
     # Here we create the problem
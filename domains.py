@@ -0,0 +1,198 @@
+"""domains.py"""
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Sequence
+
+
+def index_values(values: Sequence[Hashable]) -> Dict[Hashable, int]:
+    """
+        Map every value of a static domain to its bit position.
+
+        Args:
+            values: the full (unpruned) domain of a variable
+        Returns:
+            a dict of {value: bit position}
+    """
+    return {value: i for i, value in enumerate(values)}
+
+
+class BitsetDomain():
+    """
+    The live domain of one variable, stored as an integer bitset.
+
+    The values of the static domain are indexed once; bit i of 'mask' is set
+    while values[i] is still consistent. Pruning, restoring, size and emptiness
+    queries become bit operations instead of list scans, and iteration always
+    yields the remaining values in their original order, no matter in which
+    order they were restored.
+
+    The class mimics the parts of the list interface used by the CSP routines
+    (iteration, len, truth value, indexing, slicing, remove and append) so it
+    can be stored in CSP.curr_domains in place of a list. Like a list, it is
+    mutable, compares by content and is not hashable.
+    """
+
+    __slots__ = ("values", "index", "mask")
+
+    def __init__(
+        self,
+        values: Sequence[Hashable],
+        index: Optional[Dict[Hashable, int]] = None,
+        mask: Optional[int] = None):
+        """
+            Args:
+                values: the full (unpruned) domain of the variable
+                index: a dict of {value: bit position}, can be shared
+                    between domains over the same values
+                mask: the initial live bitset, every value when omitted
+        """
+        self.values = values
+        self.index = index if index is not None else index_values(values)
+        self.mask = (1 << len(values)) - 1 if mask is None else mask
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __contains__(self, value: Hashable) -> bool:
+        bit = self.index.get(value)
+        return bit is not None and (self.mask >> bit) & 1 == 1
+
+    def __iter__(self) -> Iterator[Any]:
+        mask = self.mask
+        values = self.values
+        while mask:
+            low = mask & -mask
+            yield values[low.bit_length() - 1]
+            mask ^= low
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(self)[key]
+        if key < 0:
+            key += len(self)
+        if key < 0:
+            raise IndexError("domain index out of range")
+        for i, value in enumerate(self):
+            if i == key:
+                return value
+        raise IndexError("domain index out of range")
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, BitsetDomain):
+            return self.values is other.values and self.mask == other.mask
+        return list(self) == other
+
+    # mutable and compared by content, so unhashable like list
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "BitsetDomain(" + repr(list(self)) + ")"
+
+    def remove(self, value: Hashable):
+        """
+            Rule out value; raises ValueError if it is not live, or not in
+            the static domain at all, as list.remove does
+        """
+        bit = self.index.get(value)
+        if bit is None or not (self.mask >> bit) & 1:
+            raise ValueError("BitsetDomain.remove(x): x not in domain")
+        self.mask ^= 1 << bit
+
+    def append(self, value: Hashable):
+        """Bring value back into the domain."""
+        self.mask |= 1 << self.index[value]
+
+    def restrict(self, value: Hashable):
+        """Keep value as the only live value."""
+        self.mask = 1 << self.index[value]
+
+    def values_of(self, mask: int) -> List[Any]:
+        """Return the values whose bits are set in mask, in domain order."""
+        result = []
+        values = self.values
+        while mask:
+            low = mask & -mask
+            result.append(values[low.bit_length() - 1])
+            mask ^= low
+        return result
+
+
+class Trail():
+    """
+    A preallocated undo stack of prunes with level marks.
+
+    Every prune pushes its (var, value) pair onto two parallel, preallocated
+    slot lists; mark() opens a new level and undo() restores every value
+    pruned since the last mark. Backtracking therefore pops back to a mark
+    instead of building and replaying a fresh removals list at every node.
+    """
+
+    __slots__ = ("vars", "vals", "top", "marks", "depth", "high_water")
+
+    def __init__(
+        self,
+        capacity: int,
+        levels: int):
+        """
+            Args:
+                capacity: number of prune slots to preallocate; the sum of the
+                    domain sizes is an upper bound, since a value can be pruned
+                    at most once along a search path
+                levels: number of level marks to preallocate, usually the
+                    number of variables
+        """
+        capacity = max(capacity, 1)
+        self.vars = [None] * capacity
+        self.vals = [None] * capacity
+        self.top = 0
+        self.marks = [0] * (levels + 1)
+        self.depth = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return self.top
+
+    def mark(self):
+        """Open a new level; the next undo() stops here."""
+        if self.depth == len(self.marks):
+            self.marks.extend([0] * len(self.marks))
+        self.marks[self.depth] = self.top
+        self.depth += 1
+
+    def push(
+        self,
+        var: Hashable,
+        value: Hashable):
+        """Record that value was pruned from the domain of var."""
+        top = self.top
+        if top == len(self.vars):
+            self.vars.extend([None] * top)
+            self.vals.extend([None] * top)
+        self.vars[top] = var
+        self.vals[top] = value
+        top += 1
+        self.top = top
+        if top > self.high_water:
+            self.high_water = top
+
+    def undo(
+        self,
+        domains: Dict[Hashable, Any],
+        listener: Any = None):
+        """
+            Put back every value pruned since the last mark and drop the mark.
+
+            Args:
+                domains: the curr_domains the prunes were applied to
+                listener: if given, its domain_changed(var) is called for
+                    every restored value
+        """
+        self.depth -= 1
+        mark = self.marks[self.depth]
+        variables, values = self.vars, self.vals
+        for i in range(self.top - 1, mark - 1, -1):
+            domains[variables[i]].append(values[i])
+            if listener is not None:
+                listener.domain_changed(variables[i])
+        self.top = mark
@@ -0,0 +1,285 @@
+"""generator.py"""
+import random
+import hashlib
+from functools import reduce
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import csp
+from Kenken import Kenken, operation
+
+CELL_TYPE = Tuple[int, int]
+CAGE_TYPE = Tuple[Tuple[CELL_TYPE, ...], str, int]
+
+
+class PuzzleGenerator():
+    """
+    Stream of random Kenken puzzles with a unique solution.
+
+    The board is indexed as a flat grid (cell i is (i % size + 1,
+    i // size + 1)) with the orthogonal neighbors of every cell computed
+    once, so growing a cage only looks at the cells around it. Every puzzle
+    is checked by searching for a second solution; while there is one, the
+    cages are repaired around a cell where the two solutions differ, by
+    merging its cage with a neighboring cage when the result is small
+    enough, or else by splitting the cell off as a given ('.' cage). Only
+    the cages involved change, the rest of the puzzle is kept. A merge can
+    undo an earlier split, so after max_repairs repairs a puzzle falls back
+    to splitting every ambiguous cell off as a given, which ends after at
+    most size * size more checks since the givens only grow.
+
+    Puzzles are reproducible from the seed: two generators built with the
+    same arguments yield the same stream.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        seed: Optional[int] = None,
+        max_cage: int = 4,
+        unique: bool = True,
+        max_repairs: Optional[int] = None):
+        """
+            Args:
+                size: the size of the boards
+                seed: the seed of the generator's random.Random
+                max_cage: the largest cage built, merges included
+                unique: repair the puzzles until their solution is unique
+                max_repairs: the repairs allowed per puzzle before the
+                    fallback to givens, 4 * size by default
+        """
+        self.size = size
+        self.rng = random.Random(seed)
+        self.max_cage = max_cage
+        self.unique = unique
+        self.max_repairs = 4 * size if max_repairs is None else max_repairs
+        self.cells = [(i % size + 1, i // size + 1) for i in range(size * size)]
+        self.adjacent = [
+            [j for j in (i - size, i + size) if 0 <= j < size * size] +
+            [j for j in (i - 1, i + 1) if 0 <= j < size * size and j // size == i // size]
+            for i in range(size * size)]
+        # used in benchmarking
+        self.repairs = 0
+        self.fallbacks = 0
+        self.checks = 0
+
+    def latin_square(self) -> List[int]:
+        """A random latin square as a flat list of values in [1...size]."""
+        size, rng = self.size, self.rng
+        rows, cols, symbols = list(range(size)), list(range(size)), list(range(1, size + 1))
+        rng.shuffle(rows)
+        rng.shuffle(cols)
+        rng.shuffle(symbols)
+        return [symbols[(rows[i // size] + cols[i % size]) % size] for i in range(size * size)]
+
+    def partition(self) -> List[int]:
+        """
+            Cut the grid into random connected cages of 1 to max_cage cells;
+            returns the cage id of every cell
+        """
+        rng, adjacent = self.rng, self.adjacent
+        cage_of = [-1] * (self.size * self.size)
+        cage = 0
+        for root in range(len(cage_of)):
+            if cage_of[root] != -1:
+                continue
+            cage_of[root] = cage
+            members = [root]
+            for _ in range(rng.randint(1, self.max_cage) - 1):
+                frontier = [j for i in members for j in adjacent[i] if cage_of[j] == -1]
+                if not frontier:
+                    break
+                cell = rng.choice(frontier)
+                cage_of[cell] = cage
+                members.append(cell)
+            cage += 1
+        return cage_of
+
+    def clique(self, members: List[int], board: List[int]) -> CAGE_TYPE:
+        """The clique of the given cells, with an operation chosen as generate() does."""
+        values = [board[i] for i in members]
+        if len(values) == 1:
+            operator, target = ".", values[0]
+        elif len(values) == 2:
+            high, low = max(values), min(values)
+            operator = "/" if high % low == 0 else "-"
+            target = high // low if operator == "/" else high - low
+        else:
+            operator = self.rng.choice("+*")
+            target = reduce(operation(operator), values)
+        return tuple(self.cells[i] for i in members), operator, int(target)
+
+    def alternative(self, cliques: List[CAGE_TYPE], board: List[int]) -> Optional[Dict[CELL_TYPE, int]]:
+        """
+            Search for a solution other than the board, stopping at the second
+            one found; returns it as {cell: value}, None if the board is the
+            only solution
+        """
+        ken = Kenken(self.size, list(cliques))
+        search = csp.IterativeBacktracking(ken, csp.IncrementalMRV(ken),
+                                           inference=csp.forward_checking)
+        for _ in range(2):
+            if search.run() != "solved":
+                break
+            grid = {cell: value for members, values in search.result.items()
+                    for cell, value in zip(members, values)}
+            if any(grid[self.cells[i]] != board[i] for i in range(len(board))):
+                self.checks += ken.checks
+                return grid
+        self.checks += ken.checks
+        return None
+
+    def repair(self, cage_of: List[int], board: List[int], ambiguous: List[int]):
+        """
+            Change the cages around one of the ambiguous cells (cells whose
+            value differs between two solutions): merge its cage with a
+            neighboring one if the result has at most max_cage cells,
+            otherwise make the cell a cage of its own, splitting the rest of
+            its old cage into connected parts
+        """
+        rng, adjacent = self.rng, self.adjacent
+        self.repairs += 1
+        cell = rng.choice(ambiguous)
+        cage = cage_of[cell]
+        size_of = {}
+        for c in cage_of:
+            size_of[c] = size_of.get(c, 0) + 1
+
+        others = [cage_of[j] for j in adjacent[cell] if cage_of[j] != cage]
+        rng.shuffle(others)
+        for other in others:
+            if size_of[cage] + size_of[other] <= self.max_cage:
+                for i, c in enumerate(cage_of):
+                    if c == other:
+                        cage_of[i] = cage
+                return
+
+        self.split(cage_of, cell)
+
+    def split(self, cage_of: List[int], cell: int):
+        """
+            Make the cell a cage of its own (a given), splitting the rest of
+            its old cage into connected parts
+        """
+        adjacent = self.adjacent
+        cage = cage_of[cell]
+        rest = [i for i, c in enumerate(cage_of) if c == cage and i != cell]
+        if not rest:
+            return
+        fresh = max(cage_of) + 1
+        cage_of[cell] = fresh
+        seen = set()
+        for start in rest:
+            if start in seen:
+                continue
+            fresh += 1
+            part, stack = fresh, [start]
+            seen.add(start)
+            while stack:
+                i = stack.pop()
+                cage_of[i] = part
+                for j in adjacent[i]:
+                    if j not in seen and cage_of[j] == cage:
+                        seen.add(j)
+                        stack.append(j)
+
+    def puzzle(self) -> Tuple[int, List[CAGE_TYPE]]:
+        """
+            A new puzzle as (size, cliques), in the format of generate();
+            unique unless the generator was built with unique=False
+        """
+        board = self.latin_square()
+        cage_of = self.partition()
+        built = {}
+        repairs = 0
+        while True:
+            groups = {}
+            for i, c in enumerate(cage_of):
+                groups.setdefault(c, []).append(i)
+            # cliques of unchanged cages are kept, so their operation stays
+            built = {c: built[c] if c in built and len(built[c][0]) == len(members)
+                     else self.clique(members, board)
+                     for c, members in groups.items()}
+            cliques = list(built.values())
+            if not self.unique:
+                return self.size, cliques
+            other = self.alternative(cliques, board)
+            if other is None:
+                return self.size, cliques
+            ambiguous = [i for i in range(len(board)) if other[self.cells[i]] != board[i]]
+            if repairs < self.max_repairs:
+                self.repair(cage_of, board, ambiguous)
+            else:
+                if repairs == self.max_repairs:
+                    self.fallbacks += 1
+                for cell in ambiguous:
+                    self.split(cage_of, cell)
+            repairs += 1
+
+    def __iter__(self) -> Iterator[Tuple[int, List[CAGE_TYPE]]]:
+        while True:
+            yield self.puzzle()
+
+
+def generate_unique(size: int, count: int, seed: Optional[int] = None, **options) -> Iterator[Tuple[int, List[CAGE_TYPE]]]:
+    """
+        Yield count unique-solution puzzles of the given size, reproducibly
+        from seed; options go to PuzzleGenerator
+    """
+    generator = PuzzleGenerator(size, seed=seed, **options)
+    for _ in range(count):
+        yield generator.puzzle()
+
+
+# -------------------------------------------------------------------------------------
+
+def refine(size: int, cliques: List[CAGE_TYPE], transpose: bool = False) -> bytes:
+    """
+        Weisfeiler-Lehman color refinement of the puzzle seen as a graph of
+        cells, rows, columns and cages (each cell linked to its row, its
+        column and its cage; cages colored by operation, target and size),
+        run until the number of colors stops growing. Returns a digest of
+        the final multiset of colors, which does not depend on the order of
+        the rows, of the columns or of the cages.
+
+        Colors are hashes of tuples of ints, which, unlike hashes of
+        strings, are the same in every process.
+    """
+    cells = size * size
+    # nodes: cells 0..cells-1, rows, columns, then cages
+    color = [0] * cells + [1] * size + [2] * size
+    links = [[] for _ in range(cells + 2 * size)]
+    for x in range(size):
+        for y in range(size):
+            cell = y * size + x
+            links[cell] += [cells + y, cells + size + x]
+            links[cells + y].append(cell)
+            links[cells + size + x].append(cell)
+    for members, operator, target in cliques:
+        cage = len(color)
+        color.append(hash(("+-*/.".index(operator) + 3, target, len(members))))
+        links.append([])
+        for x, y in members:
+            cell = (x - 1) * size + (y - 1) if transpose else (y - 1) * size + (x - 1)
+            links[cell].append(cage)
+            links[cage].append(cell)
+
+    distinct = len(set(color))
+    while True:
+        color = [hash((color[node], tuple(sorted(color[n] for n in links[node]))))
+                 for node in range(len(color))]
+        refined = len(set(color))
+        if refined == distinct:
+            break
+        distinct = refined
+
+    return hashlib.blake2b(repr((size, sorted(color))).encode(), digest_size=16).digest()
+
+
+def canonical_hash(size: int, cliques: List[CAGE_TYPE]) -> bytes:
+    """
+        A hash of the puzzle that is the same for every puzzle obtained from
+        it by permuting rows, permuting columns or transposing, and so by
+        any rotation or reflection too. Distinct puzzles collide only when
+        color refinement cannot tell them apart, which is rare.
+    """
+    return min(refine(size, cliques), refine(size, cliques, transpose=True))
@@ -1,4 +1,5 @@
 # Helper functions for the gui
+from parsing import parse_cage
 
 def Generate_Random_Colors(num_colors, color_type='rgb'):
     """ Generate random colors in HEX or RGB ( default ) """
@@ -87,8 +88,10 @@ def Create_Law_Positions(data: str) -> dict:
 
     result = {}
 
-    for item in myData:
-        extracted = eval(item)
-        result[extracted[0]] = f"{extracted[2]} {extracted[1]}"
+    for line_number, item in enumerate(myData, 1):
+        if not item.strip():
+            continue
+        members, operator, target = parse_cage(item, line_number)
+        result[members] = f"{target} {operator}"
 
     return result
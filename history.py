@@ -0,0 +1,215 @@
+"""history.py"""
+import csv
+import json
+import math
+import sqlite3
+import platform
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmark import METRICS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    commit_id TEXT,
+    machine TEXT,
+    config TEXT,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS records (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    algorithm TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    puzzle INTEGER,
+    status TEXT,
+    wall REAL, cpu REAL, nodes REAL, checks REAL, prunes REAL, peak_memory REAL
+);
+CREATE INDEX IF NOT EXISTS records_by_run ON records (run_id, algorithm, size);
+"""
+
+
+def current_commit() -> Optional[str]:
+    """The git commit of the working tree, None outside a repository."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine_id() -> str:
+    """The host, architecture and Python version the benchmark ran on."""
+    return "%s %s %s %s" % (platform.node(), platform.machine(),
+                            platform.python_implementation(), platform.python_version())
+
+
+def mann_whitney(x: np.ndarray, y: np.ndarray) -> Tuple[float, float]:
+    """
+        Two-sided Mann-Whitney U test, with the normal approximation and the
+        tie correction. Returns (U of x, p-value); the p-value is 1.0 when
+        the samples are too small or all equal to tell anything apart.
+    """
+    n1, n2 = len(x), len(y)
+    values = np.concatenate([x, y])
+    order = values.argsort(kind="mergesort")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(1, len(values) + 1)
+    # tied values share the mean of their ranks
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    ranks = sums[inverse] / counts[inverse]
+
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - (counts ** 3 - counts).sum() / (n * (n - 1))) if n > 1 else 0
+    if n1 < 2 or n2 < 2 or variance <= 0:
+        return float(u), 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return float(u), float(min(1.0, math.erfc(max(z, 0) / math.sqrt(2))))
+
+
+class History():
+    """
+    Benchmark runs (the results of benchmark.run) kept in a SQLite file,
+    each tagged with the commit, the machine and the configuration it was
+    run with, to compare runs and follow the solver's speed over time.
+    """
+
+    def __init__(self, path: str = "benchmarks.sqlite"):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_run(
+        self,
+        results: Dict[str, object],
+        commit: Optional[str] = None,
+        machine: Optional[str] = None,
+        label: Optional[str] = None) -> int:
+        """
+            Store the records of a benchmark.run result; commit and machine
+            default to the current ones. Returns the id of the run.
+        """
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO runs (created, commit_id, machine, config, label) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), commit or current_commit(), machine or machine_id(),
+                 json.dumps(results.get("config")), label))
+            run_id = cursor.lastrowid
+            self.db.executemany(
+                "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, r["algorithm"], r["size"], r.get("puzzle"), r.get("status"))
+                 + tuple(r.get(metric) for metric in METRICS)
+                 for r in results["records"]])
+        return run_id
+
+    def import_csv(self, path: str = "Statistics.csv", label: str = "baseline") -> int:
+        """
+            Store a Statistics.csv as a run, one record per (algorithm, size)
+            holding the wall time it reports; such a run has a single sample
+            per cell, so comparisons against it use the threshold alone.
+            Returns the id of the run.
+        """
+        records = []
+        with open(path, newline="") as source:
+            rows = list(csv.reader(source))
+        sizes = [int(size) for size in rows[0][1:]]
+        for row in rows[1:]:
+            for size, wall in zip(sizes, row[1:]):
+                if wall:
+                    records.append({"algorithm": row[0], "size": size,
+                                    "status": "imported", "wall": float(wall)})
+        return self.add_run({"config": {"imported": path}, "records": records},
+                            commit=label, machine="unknown", label=label)
+
+    def runs(self) -> List[Tuple]:
+        """(id, created, commit, machine, label) of every run, oldest first."""
+        return self.db.execute(
+            "SELECT id, created, commit_id, machine, label FROM runs ORDER BY created, id").fetchall()
+
+    def samples(self, run_id: int, metric: str = "wall") -> Dict[Tuple[str, int], np.ndarray]:
+        """The values of a metric in a run, for every (algorithm, size)."""
+        if metric not in METRICS:
+            raise ValueError("unknown metric " + repr(metric))
+        groups = {}
+        for algorithm, size, value in self.db.execute(
+                "SELECT algorithm, size, %s FROM records WHERE run_id = ? AND %s IS NOT NULL"
+                % (metric, metric), (run_id,)):
+            groups.setdefault((algorithm, size), []).append(value)
+        return {key: np.array(values, dtype=float) for key, values in groups.items()}
+
+    def compare(
+        self,
+        base: int,
+        new: int,
+        metric: str = "wall",
+        threshold: float = 0.05,
+        alpha: float = 0.05) -> List[Dict[str, object]]:
+        """
+            Compare two runs per (algorithm, size) present in both
+
+            The distributions are compared with a Mann-Whitney U test; a
+            cell is flagged as a regression (or an improvement) when its
+            median moved by more than threshold (a fraction of the base
+            median) and the test rejects equal distributions at level
+            alpha. Cells with a single sample on either side, e.g. from an
+            imported CSV, are judged on the threshold alone.
+
+            Returns:
+                one dict per cell: algorithm, size, base and new medians,
+                change (new / base - 1), p-value and verdict ("regression",
+                "improvement" or "same")
+        """
+        before, after = self.samples(base, metric), self.samples(new, metric)
+        report = []
+        for key in sorted(set(before) & set(after)):
+            x, y = before[key], after[key]
+            base_median, new_median = float(np.median(x)), float(np.median(y))
+            change = new_median / base_median - 1 if base_median else 0.0
+            if len(x) > 1 and len(y) > 1:
+                _, p = mann_whitney(x, y)
+                significant = p < alpha
+            else:
+                p, significant = None, True
+            verdict = "same"
+            if significant and change > threshold:
+                verdict = "regression"
+            elif significant and change < -threshold:
+                verdict = "improvement"
+            report.append({"algorithm": key[0], "size": key[1], "base": base_median,
+                           "new": new_median, "change": change, "p": p, "verdict": verdict})
+        return report
+
+    def trend(self, metric: str = "wall") -> str:
+        """
+            A text table of the median of a metric in every run (rows,
+            oldest first) for every (algorithm, size) (columns)
+        """
+        runs = self.runs()
+        medians = {run[0]: {key: float(np.median(values))
+                            for key, values in self.samples(run[0], metric).items()}
+                   for run in runs}
+        keys = sorted(set(key for cells in medians.values() for key in cells))
+        header = ["run", "date", "commit"] + ["%s %d" % key for key in keys]
+        lines = [header]
+        for run_id, created, commit, _, _ in runs:
+            lines.append([str(run_id), time.strftime("%Y-%m-%d %H:%M", time.localtime(created)),
+                          (commit or "")[:10]] +
+                         ["%.4g" % medians[run_id][key] if key in medians[run_id] else "-"
+                          for key in keys])
+        widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+        return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths))
+                         for line in lines)
@@ -0,0 +1,605 @@
+"""parallel.py"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import multiprocessing as mp
+from functools import partial
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+import csp
+from Kenken import solve, validate, Kenken, INFERENCES
+from generator import PuzzleGenerator, canonical_hash
+from corpus import CorpusWriter
+
+# seconds between two checks of the worker processes while waiting for a message
+POLL = 0.1
+
+# configurations raced by solve_portfolio: a name plus keyword arguments of Kenken.solve
+PORTFOLIO = [
+    {"name": "FC+MRV", "algorithm": "Forward Checking"},
+    {"name": "MAC+MRV", "algorithm": "Arc Consistency"},
+    {"name": "FC", "algorithm": "Forward Checking", "variable_order": "first"},
+    {"name": "MAC", "algorithm": "Arc Consistency", "variable_order": "first"},
+    {"name": "FC+LCV", "algorithm": "Forward Checking", "value_order": "lcv"},
+    {"name": "FC-CBJ", "algorithm": "Forward Checking", "backjumping": True},
+    {"name": "Restarts-1", "algorithm": "Forward Checking", "restarts": True, "rseed": 1},
+    {"name": "Restarts-2", "algorithm": "Forward Checking", "restarts": True, "rseed": 2},
+    {"name": "BT", "algorithm": "Backtracking"},
+]
+
+
+def run_config(results, name, size, cellAssignments, options):
+    """
+        Worker process body: solve one puzzle with one configuration and
+        report (name, solution, status, seconds) on the results queue
+    """
+    t0 = time.perf_counter()
+    try:
+        solution = solve(size, cellAssignments, **options)
+        status = "done"
+    except Exception as error:
+        solution, status = None, "error: " + repr(error)
+    results.put((name, solution, status, time.perf_counter() - t0))
+
+
+def solve_portfolio(
+    size: int,
+    cellAssignments: list,
+    configs: Optional[List[Dict]] = None,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    record_path: Optional[str] = None) -> Tuple[Optional[dict], Optional[str]]:
+    """
+        Race several solver configurations on the same puzzle, each in its
+        own process, and keep the first answer
+
+        Every configuration is complete, so the first one to finish settles
+        the puzzle, whether it found a solution or proved there is none; the
+        other processes are then terminated and joined. A configuration that
+        raises, or whose process dies without answering (see wait_message),
+        is ignored and its slot is given to the next one waiting.
+
+        Args:
+            size: the size of the puzzle
+            cellAssignments: a list of cell assignments
+            configs: the configurations to race, PORTFOLIO by default; each
+                one is a dict with a unique "name" and keyword arguments of
+                solve
+            workers: the number of processes, os.cpu_count() by default;
+                configurations beyond it wait for a slot
+            timeout: seconds to wait for an answer before giving up
+            record_path: a JSON lines file that gets one record per puzzle
+                naming the winning configuration (see winner_counts)
+
+        Returns:
+            (solution, name of the winning configuration), or (None, None)
+            when no configuration answered in time
+        Raises:
+            ValueError: two configurations share a name
+    """
+    configs = list(configs or PORTFOLIO)
+    names = Counter(config["name"] for config in configs)
+    if any(n > 1 for n in names.values()):
+        raise ValueError("Configuration names must be unique: %s"
+                         % sorted(name for name, n in names.items() if n > 1))
+    workers = workers or os.cpu_count() or 1
+    deadline = None if timeout is None else time.perf_counter() + timeout
+
+    results = mp.Queue()
+    running = {}
+
+    def launch(config):
+        options = {k: v for k, v in config.items() if k != "name"}
+        process = mp.Process(target=run_config,
+                             args=(results, config["name"], size, list(cellAssignments), options),
+                             daemon=True)
+        process.start()
+        running[config["name"]] = process
+
+    t0 = time.perf_counter()
+    solution, winner = None, None
+    try:
+        while configs and len(running) < workers:
+            launch(configs.pop(0))
+        while running:
+            try:
+                message = wait_message(results, running, deadline)
+            except WorkerLost as lost:
+                for name in lost.keys:
+                    running.pop(name).join()
+                    if configs:
+                        launch(configs.pop(0))
+                continue
+            if message is None:
+                break
+            name, answer, status, _ = message
+            running.pop(name).join()
+            if status != "done":
+                if configs:
+                    launch(configs.pop(0))
+                continue
+            solution, winner = answer, name
+            break
+    finally:
+        for process in running.values():
+            process.terminate()
+        for process in running.values():
+            process.join()
+        results.close()
+
+    if record_path is not None:
+        with open(record_path, "a") as record:
+            record.write(json.dumps({
+                "size": size,
+                "cages": len(cellAssignments),
+                "winner": winner,
+                "solved": solution is not None,
+                "seconds": time.perf_counter() - t0,
+            }) + "\n")
+
+    return solution, winner
+
+
+def winner_counts(record_path: str) -> Counter:
+    """
+        Count how often each configuration won, from the records written by
+        solve_portfolio, to tune the default configuration over time
+    """
+    counts = Counter()
+    with open(record_path) as record:
+        for line in record:
+            if line.strip():
+                counts[json.loads(line)["winner"]] += 1
+    return counts
+
+
+# -------------------------------------------------------------------------------------
+
+class WorkerLost(RuntimeError):
+    """
+    Raised by wait_message when worker processes exited without reporting
+    (killed, out of memory, crashed); keys names them and exitcodes gives
+    their exit codes.
+    """
+
+    def __init__(self, keys, exitcodes):
+        self.keys = keys
+        self.exitcodes = exitcodes
+        RuntimeError.__init__(self, "workers %s exited with codes %s before reporting"
+                              % (list(keys), list(exitcodes)))
+
+
+def wait_message(results, running: Dict, deadline: Optional[float] = None):
+    """
+        Get the next message of the worker processes from the results
+        queue, checking every POLL seconds that the workers which have not
+        reported yet (running, {key: process}) are still alive, so that a
+        dead one does not block the parent forever. A worker's message is
+        in the queue's pipe before the worker exits, so a worker is only
+        declared lost after one more poll finds nothing.
+
+        Returns:
+            the message, or None once deadline (a time.perf_counter()) passed
+        Raises:
+            WorkerLost: workers in running exited without a message
+    """
+    exited = set()
+    while True:
+        wait = POLL if deadline is None else min(POLL, max(deadline - time.perf_counter(), 0))
+        try:
+            return results.get(timeout=wait)
+        except queue.Empty:
+            pass
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        lost = exited & {key for key, process in running.items() if process.exitcode is not None}
+        if lost:
+            raise WorkerLost(sorted(lost), [running[key].exitcode for key in sorted(lost)])
+        exited = {key for key, process in running.items() if process.exitcode is not None}
+
+
+def search_worker(index, ken, algorithm, mode, slice_nodes, tasks, pending, hungry, results):
+    """
+        Worker process body of solve_parallel: take prefixes from the tasks
+        queue and search below them, slice_nodes nodes at a time. Between
+        slices, if another worker is idle and the queue is empty, give the
+        untried values of the shallowest open frame back to the queue.
+        'pending' counts the prefixes queued or being searched, so the work
+        is over when it drops to zero. Reports ("solution", index,
+        assignment) as soon as one is found in "first" mode, and ("count",
+        index, solutions, nodes) when the work is over.
+    """
+    inference = INFERENCES[algorithm]
+    solutions = nodes = 0
+    idle = False
+    while True:
+        try:
+            prefix = tasks.get(timeout=0.01)
+        except queue.Empty:
+            if pending.value == 0:
+                break
+            if not idle:
+                idle = True
+                with hungry.get_lock():
+                    hungry.value += 1
+            continue
+        if idle:
+            idle = False
+            with hungry.get_lock():
+                hungry.value -= 1
+
+        ken.curr_domains = None
+        search = csp.IterativeBacktracking(ken, csp.IncrementalMRV(ken),
+                                           inference=inference, prefix=prefix)
+        while True:
+            status = search.run(max_nodes=slice_nodes)
+            if status == "paused":
+                if hungry.value > 0 and tasks.empty():
+                    for task in search.split():
+                        with pending.get_lock():
+                            pending.value += 1
+                        tasks.put(task)
+            elif status == "solved":
+                if mode == "first":
+                    results.put(("solution", index, search.result))
+                    return
+                solutions += 1
+            else:
+                break
+        nodes += search.nodes
+        with pending.get_lock():
+            pending.value -= 1
+
+    results.put(("count", index, solutions, nodes))
+
+
+def split_prefixes(ken, algorithm, workers, split_depth):
+    """
+        Cut the top of the search tree into prefixes for solve_parallel:
+        expand every prefix by one level, at most split_depth times, until
+        there are about four per worker. Inconsistent prefixes are dropped.
+    """
+    inference = INFERENCES[algorithm]
+    prefixes = [[]]
+    for _ in range(split_depth):
+        if len(prefixes) >= 4 * workers:
+            break
+        expanded = []
+        for prefix in prefixes:
+            ken.curr_domains = None
+            search = csp.IterativeBacktracking(ken, csp.IncrementalMRV(ken),
+                                               inference=inference, prefix=prefix)
+            status = search.start()
+            if status == "paused":
+                expanded.extend(search.split())
+            elif status == "solved":
+                expanded.append(prefix)
+        prefixes = expanded
+    ken.curr_domains = None
+    ken.domain_listener = None
+    return prefixes
+
+
+def solve_parallel(
+    size: int,
+    cellAssignments: list,
+    algorithm: str = "Forward Checking",
+    mode: str = "first",
+    workers: Optional[int] = None,
+    split_depth: int = 3,
+    slice_nodes: int = 200) -> Union[Optional[dict], Tuple[int, int]]:
+    """
+        Split the search tree of one puzzle between several processes
+
+        The top levels of the tree are cut into prefixes (assignments of the
+        first few cages) that the workers take from a shared queue; a worker
+        with a large subtree hands part of it back to the queue whenever
+        another one runs out of work, so no process idles while the search
+        is uneven. Every worker searches its own copy of the puzzle with
+        IterativeBacktracking and IncrementalMRV. The prefixes travel on a
+        multiprocessing.Queue, and the parent polls the workers while it
+        waits for them, so one that dies (killed, out of memory) ends the
+        search with WorkerLost instead of blocking it forever: the subtree
+        it held is lost, so there is no sound answer to return.
+
+        Args:
+            size: the size of the puzzle
+            cellAssignments: a list of cell assignments
+            algorithm: the algorithm name, as in Kenken.solve
+            mode: "first" to stop at the first solution, "count" to explore
+                the whole tree and count the solutions
+            workers: the number of processes, os.cpu_count() by default
+            split_depth: the number of levels cut up front
+            slice_nodes: nodes searched between two checks for idle workers
+
+        Returns:
+            in "first" mode the solution, or None if there is none;
+            in "count" mode (number of solutions, nodes searched)
+        Raises:
+            WorkerLost: a worker exited before reporting
+    """
+    if mode not in ("first", "count") or algorithm not in INFERENCES:
+        return None
+    workers = workers or os.cpu_count() or 1
+
+    cliques = list(cellAssignments)
+    validate(size, cliques)
+    ken = Kenken(size, cliques)
+
+    prefixes = split_prefixes(ken, algorithm, workers, split_depth)
+
+    tasks = mp.Queue()
+    results = mp.Queue()
+    pending = mp.Value("i", len(prefixes))
+    hungry = mp.Value("i", 0)
+    for prefix in prefixes:
+        tasks.put(prefix)
+
+    processes = [mp.Process(target=search_worker,
+                            args=(index, ken, algorithm, mode, slice_nodes, tasks, pending, hungry, results),
+                            daemon=True)
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    running = dict(enumerate(processes))
+    solution, solutions, nodes = None, 0, 0
+    try:
+        while running:
+            message = wait_message(results, running)
+            if message[0] == "solution":
+                solution = message[2]
+                break
+            del running[message[1]]
+            solutions += message[2]
+            nodes += message[3]
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        tasks.close()
+        results.close()
+
+    if mode == "first":
+        return solution
+    return solutions, nodes
+
+
+# -------------------------------------------------------------------------------------
+
+def solve_chunk(chunk, algorithm, timeout):
+    """
+        Pool task of solve_many: solve every (puzzle_id, size,
+        cellAssignments) of the chunk and return a list of
+        (puzzle_id, solution, stats); stats holds the status ("solved",
+        "failed", "timeout" or "error: ..."), seconds, nodes and checks.
+    """
+    answers = []
+    for puzzle_id, size, cellAssignments in chunk:
+        t0 = time.perf_counter()
+        solution, nodes, checks = None, 0, 0
+        try:
+            ken = Kenken(size, list(cellAssignments))
+            search = csp.IterativeBacktracking(ken, csp.IncrementalMRV(ken),
+                                               inference=INFERENCES[algorithm])
+            deadline = None if timeout is None else t0 + timeout
+            status = search.run(deadline=deadline)
+            if status == "paused":
+                status = "timeout"
+            solution, nodes, checks = search.result, search.nodes, ken.checks
+        except Exception as error:
+            status = "error: " + repr(error)
+        answers.append((puzzle_id, solution, {
+            "status": status,
+            "seconds": time.perf_counter() - t0,
+            "nodes": nodes,
+            "checks": checks,
+        }))
+    return answers
+
+
+def solve_many(
+    puzzles: Iterable[tuple],
+    algorithm: str = "Forward Checking",
+    workers: Optional[int] = None,
+    chunksize: int = 1,
+    ordered: bool = True,
+    timeout: Optional[float] = None,
+    max_pending: Optional[int] = None) -> Iterator[Tuple[object, Optional[dict], dict]]:
+    """
+        Solve a stream of puzzles with a pool of processes, yielding
+        (puzzle_id, solution, stats) as the answers come back
+
+        The input is read lazily, chunksize puzzles per pool task, and at
+        most max_pending chunks are submitted but not yet yielded, so memory
+        stays bounded however long the stream is. A puzzle that runs past
+        its timeout, or that is malformed, gets a status in its stats
+        instead of stopping the batch (see solve_chunk).
+
+        Args:
+            puzzles: (size, cellAssignments) pairs, whose puzzle_id is their
+                position in the stream, or (puzzle_id, size, cellAssignments)
+            algorithm: the algorithm name, as in Kenken.solve
+            workers: the number of processes, os.cpu_count() by default
+            chunksize: the number of puzzles sent to a worker at once
+            ordered: yield the answers in input order, otherwise as they finish
+            timeout: seconds allowed per puzzle
+            max_pending: chunks in flight, 2 * workers by default
+
+        Returns:
+            an iterator of (puzzle_id, solution or None, stats)
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+
+    def tagged():
+        for position, puzzle in enumerate(puzzles):
+            yield puzzle if len(puzzle) == 3 else (position,) + tuple(puzzle)
+
+    stream = tagged()
+    finished = queue.Queue()
+    buffered = {}
+    submitted = yielded = 0
+
+    with mp.Pool(workers) as pool:
+        while True:
+            while submitted - yielded < max_pending:
+                chunk = list(islice(stream, chunksize))
+                if not chunk:
+                    break
+                pool.apply_async(solve_chunk, (chunk, algorithm, timeout),
+                                 callback=partial(tagged_put, finished, submitted),
+                                 error_callback=partial(tagged_put, finished, submitted))
+                submitted += 1
+            if yielded == submitted:
+                break
+
+            seq, answers = finished.get()
+            if isinstance(answers, BaseException):
+                raise answers
+            if not ordered:
+                yielded += 1
+                yield from answers
+                continue
+            buffered[seq] = answers
+            while yielded in buffered:
+                answers = buffered.pop(yielded)
+                yielded += 1
+                yield from answers
+
+
+def tagged_put(finished, seq, answers):
+    """Pool callback of solve_many: hand a chunk's answers to the generator."""
+    finished.put((seq, answers))
+
+
+# -------------------------------------------------------------------------------------
+
+def generate_chunks(results, size, seed, chunk, options):
+    """
+        Worker process body of build_corpus: generate puzzles forever with
+        a PuzzleGenerator seeded with seed, and put them on the results
+        queue as lists of chunk (canonical hash, size, cliques) triples. The
+        queue is bounded, so a worker waits while the writer is behind.
+    """
+    generator = PuzzleGenerator(size, seed=seed, **options)
+    while True:
+        batch = []
+        for _ in range(chunk):
+            puzzle = generator.puzzle()
+            batch.append((canonical_hash(*puzzle),) + puzzle)
+        results.put(batch)
+
+
+def seen_among(seen, keys: List[bytes]) -> set:
+    """The keys of a chunk already in the seen table of build_corpus."""
+    known = set()
+    # stay below SQLite's limit on the number of parameters of a statement
+    for start in range(0, len(keys), 500):
+        part = keys[start:start + 500]
+        known.update(row[0] for row in seen.execute(
+            "SELECT hash FROM seen WHERE hash IN (%s)" % ", ".join("?" * len(part)), part))
+    return known
+
+
+def build_corpus(
+    path: str,
+    size: int,
+    count: int,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    chunk: int = 64,
+    max_duplicates: int = 10000,
+    seen_path: Optional[str] = None,
+    **options) -> Dict[str, int]:
+    """
+        Generate a binary corpus (see corpus.py) of up to count distinct
+        puzzles with several processes
+
+        Every worker runs its own PuzzleGenerator, seeded from an
+        independent stream spawned from seed (numpy's SeedSequence), and
+        sends its puzzles in chunks. The parent drops any puzzle whose
+        canonical_hash was already written, which also drops rotations,
+        reflections and row / column permutations of earlier puzzles, and
+        streams the others to the file. The hashes written so far are kept
+        in a SQLite table on disk, looked up and inserted once per chunk,
+        and the corpus index in a temporary file (see CorpusWriter), so the
+        parent holds one chunk of puzzles (plus SQLite's bounded page cache)
+        however large the corpus grows. Which worker's puzzles come first
+        depends on timing, so the corpus is reproducible as a set of
+        streams, not in its order.
+
+        Small boards have few distinct puzzles: the build stops early, with
+        fewer than count puzzles, after max_duplicates duplicates in a row.
+
+        Args:
+            path: the corpus file to write
+            size: the size of the puzzles
+            count: the number of distinct puzzles to write
+            workers: the number of processes, os.cpu_count() by default
+            seed: the root seed of the worker streams
+            chunk: the number of puzzles a worker sends at once
+            max_duplicates: consecutive duplicates after which the build
+                gives up on reaching count
+            seen_path: the SQLite file of the hashes, path + ".hashes" by
+                default; it is removed at the end
+            options: passed to PuzzleGenerator (max_cage, unique)
+
+        Returns:
+            {"written", "duplicates"} counts
+    """
+    workers = workers or os.cpu_count() or 1
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(workers)]
+    seen_path = seen_path or path + ".hashes"
+    if os.path.exists(seen_path):
+        os.remove(seen_path)
+    seen = sqlite3.connect(seen_path)
+    seen.execute("CREATE TABLE seen (hash BLOB PRIMARY KEY) WITHOUT ROWID")
+
+    results = mp.Queue(maxsize=2 * workers)
+    processes = [mp.Process(target=generate_chunks,
+                            args=(results, size, s, chunk, options), daemon=True)
+                 for s in seeds]
+    for process in processes:
+        process.start()
+
+    written = duplicates = in_a_row = 0
+    try:
+        with CorpusWriter(path) as writer:
+            while written < count and in_a_row < max_duplicates:
+                batch = results.get()
+                known = seen_among(seen, [key for key, _, _ in batch])
+                fresh = []
+                for key, _, cliques in batch:
+                    if key in known:
+                        duplicates += 1
+                        in_a_row += 1
+                        if in_a_row == max_duplicates:
+                            break
+                        continue
+                    known.add(key)
+                    fresh.append((key,))
+                    in_a_row = 0
+                    writer.add(size, cliques)
+                    written += 1
+                    if written == count:
+                        break
+                with seen:
+                    seen.executemany("INSERT INTO seen VALUES (?)", fresh)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        results.close()
+        seen.close()
+        os.remove(seen_path)
+
+    return {"written": written, "duplicates": duplicates}
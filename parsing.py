@@ -0,0 +1,138 @@
+"""parsing.py"""
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+CELL_TYPE = Tuple[int, int]
+CAGE_TYPE = Tuple[Tuple[CELL_TYPE, ...], str, int]
+
+# a cage line as written by str() of a generated clique:
+#   (((1, 1), (1, 2)), '+', 11)
+CELL = r"\(\s*(\d+)\s*,\s*(\d+)\s*\)"
+# cells are separated by commas, with an optional trailing one as in ((1, 1),)
+CELL_SHAPE = CELL.replace("(\\d+)", "\\d+")
+MEMBERS = CELL_SHAPE + r"(?:\s*,\s*" + CELL_SHAPE + r")*\s*,?"
+CAGE = re.compile(
+    r"\s*\(\s*\(\s*(" + MEMBERS + r")\s*\)\s*,"
+    r"\s*(['\"])([-+*/.])\2\s*,\s*(-?\d+)\s*\)\s*")
+CELLS = re.compile(CELL)
+SIZE = re.compile(r"\s*(\d+)\s*")
+
+
+class PuzzleParseError(ValueError):
+    """
+    Raised on malformed puzzle text instead of exiting the process.
+    line_number is 1-based within the parsed text (None when unknown),
+    line is the offending text and reason says what is wrong with it.
+    """
+
+    def __init__(self, reason: str, line_number: Optional[int] = None, line: str = ""):
+        self.reason = reason
+        self.line_number = line_number
+        self.line = line
+        where = "" if line_number is None else " at line %d" % line_number
+        ValueError.__init__(self, "%s%s [ %s ]" % (reason, where, line))
+
+
+class PuzzleValidationError(ValueError):
+    """
+    Raised by Kenken.validate on a puzzle that parses but is not a valid
+    board (bad operator, out-of-bounds, shared or missing cells). reason
+    says what is wrong, clique is the offending clique (None for missing
+    cells), cells the cells involved, and code the exit status validate
+    used to stop the process with.
+    """
+
+    def __init__(self, reason: str, code: int, clique=None, cells=()):
+        self.reason = reason
+        self.code = code
+        self.clique = clique
+        self.cells = sorted(cells)
+        message = reason
+        if clique is not None:
+            message += " in clique %s" % (clique,)
+        if self.cells:
+            message += ": %s" % (self.cells,)
+        ValueError.__init__(self, message)
+
+
+def parse_cage(text: str, line_number: Optional[int] = None) -> CAGE_TYPE:
+    """
+        Parse one cage line, e.g. "(((1, 1), (1, 2)), '+', 11)", into
+        (members, operator, target) without evaluating it
+
+        Raises:
+            PuzzleParseError: the line is not a cage
+    """
+    match = CAGE.fullmatch(text)
+    if match is None:
+        raise PuzzleParseError("Malformed clique", line_number, text.strip())
+    cells, _, operator, target = match.groups()
+    members = tuple((int(x), int(y)) for x, y in CELLS.findall(cells))
+    return members, operator, int(target)
+
+
+def parse_size(text: str, line_number: Optional[int] = None) -> int:
+    """
+        Parse the board size line of a puzzle
+
+        Raises:
+            PuzzleParseError: the line is not a positive integer
+    """
+    match = SIZE.fullmatch(text)
+    if match is None or int(match.group(1)) < 1:
+        raise PuzzleParseError("Unable to determine board size", line_number, text.strip())
+    return int(match.group(1))
+
+
+def iter_puzzles(lines: Union[str, Iterable[str]]) -> Iterator[Tuple[int, List[CAGE_TYPE]]]:
+    """
+        Read puzzles one at a time from text or from an iterable of lines
+        (e.g. an open file), so corpora of any length are parsed in constant
+        memory
+
+        A puzzle is a line holding its size followed by one cage per line;
+        a corpus is several puzzles one after the other. Blank lines and
+        lines starting with '#' are skipped.
+
+        Yields:
+            (size, cliques) for every puzzle, in order
+        Raises:
+            PuzzleParseError: a line is neither a size nor a cage, or a cage
+                comes before the first size
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    size, cliques = None, []
+    for line_number, line in enumerate(lines, 1):
+        content = line.strip()
+        if not content or content[0] == "#":
+            continue
+        if content[0] == "(":
+            if size is None:
+                raise PuzzleParseError("Clique before the board size", line_number, content)
+            cliques.append(parse_cage(content, line_number))
+            continue
+        if size is not None:
+            yield size, cliques
+        size, cliques = parse_size(content, line_number), []
+
+    if size is not None:
+        yield size, cliques
+
+
+def parse_puzzle(lines: Union[str, Iterable[str]]) -> Tuple[int, List[CAGE_TYPE]]:
+    """
+        Parse the single puzzle of a text or an iterable of lines
+
+        Raises:
+            PuzzleParseError: the text is malformed, or holds no puzzle or
+                more than one
+    """
+    puzzles = iter_puzzles(lines)
+    puzzle = next(puzzles, None)
+    if puzzle is None:
+        raise PuzzleParseError("No puzzle found")
+    if next(puzzles, None) is not None:
+        raise PuzzleParseError("More than one puzzle found, see iter_puzzles")
+    return puzzle
@@ -0,0 +1,23 @@
+"""Regression tests of conflict-directed backjumping on the cell model."""
+import random
+
+import pytest
+
+import csp
+from Kenken import generate
+from cellmodel import KenkenCells
+
+
+@pytest.mark.parametrize("seed", range(400, 432))
+@pytest.mark.parametrize("forward_check", [False, True])
+@pytest.mark.parametrize("learn", [False, True])
+def test_cell_model_solutions_satisfy_clique_tables(seed, forward_check, learn):
+    # KenkenCells checks whole clique tables in nconflicts; backjumping
+    # must not return assignments that only satisfy the pairwise constraints
+    random.seed(seed)
+    size, cliques = generate(4)
+    problem = KenkenCells(size, list(cliques))
+    nogoods = csp.NogoodStore() if learn else None
+    result = csp.conflict_directed_backjumping(problem, forward_check=forward_check, nogoods=nogoods)
+    assert result is not None
+    assert problem.goal_test(result)
@@ -0,0 +1,59 @@
+"""Tests of canonical_hash and the deduplicating corpus builder."""
+import random
+
+import pytest
+
+from corpus import CorpusReader
+from generator import PuzzleGenerator, canonical_hash
+from parallel import build_corpus
+
+
+def relabel(cliques, cell):
+    return [(tuple(cell(x, y) for x, y in members), operator, target)
+            for members, operator, target in cliques]
+
+
+def variants(size, cliques, rng):
+    rows, cols = list(range(1, size + 1)), list(range(1, size + 1))
+    rng.shuffle(rows)
+    rng.shuffle(cols)
+    yield relabel(cliques, lambda x, y: (x, rows[y - 1]))
+    yield relabel(cliques, lambda x, y: (cols[x - 1], y))
+    yield relabel(cliques, lambda x, y: (y, x))
+    yield relabel(cliques, lambda x, y: (size + 1 - y, x))
+    yield relabel(cliques, lambda x, y: (size + 1 - x, size + 1 - y))
+    yield relabel(cliques, lambda x, y: (rows[y - 1], cols[x - 1]))
+    yield list(reversed(cliques))
+
+
+@pytest.mark.parametrize("size", [3, 5, 7])
+def test_hash_ignores_symmetries(size):
+    rng = random.Random(size)
+    for puzzle_size, cliques in (PuzzleGenerator(size, seed=size, unique=False).puzzle() for _ in range(3)):
+        expected = canonical_hash(puzzle_size, cliques)
+        for variant in variants(size, cliques, rng):
+            assert canonical_hash(size, variant) == expected
+
+
+def test_hash_tells_puzzles_apart():
+    generator = PuzzleGenerator(6, seed=1, unique=False)
+    puzzles = [generator.puzzle() for _ in range(50)]
+    assert len(set(canonical_hash(*puzzle) for puzzle in puzzles)) == len(puzzles)
+
+
+def test_build_corpus_writes_distinct_puzzles(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    counts = build_corpus(path, 4, 40, workers=2, seed=3, chunk=8)
+    assert counts["written"] == 40
+    with CorpusReader(path) as reader:
+        assert len(set(canonical_hash(*puzzle) for puzzle in reader)) == 40
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["corpus.bin"]
+
+
+def test_build_corpus_stops_when_a_size_runs_out(tmp_path):
+    # 2x2 boards have only a handful of distinct puzzles
+    path = str(tmp_path / "corpus.bin")
+    counts = build_corpus(path, 2, 1000, workers=2, seed=3, max_duplicates=200)
+    assert counts["written"] < 1000
+    with CorpusReader(path) as reader:
+        assert len(reader) == counts["written"]
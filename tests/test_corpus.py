@@ -0,0 +1,74 @@
+"""Tests of the binary puzzle corpus."""
+import pytest
+
+from Kenken import solve
+from corpus import CorpusReader, decode_puzzle, encode_puzzle, from_text, to_text, write_corpus
+from generator import PuzzleGenerator
+
+
+def grid(solution):
+    return {cell: value for members, values in solution.items() for cell, value in zip(members, values)}
+
+
+def puzzles(size, count, seed=0):
+    generator = PuzzleGenerator(size, seed=seed, unique=False)
+    return [generator.puzzle() for _ in range(count)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 6, 9])
+def test_encode_decode_round_trip(size):
+    for puzzle_size, cliques in puzzles(size, 3, seed=size):
+        record = encode_puzzle(puzzle_size, cliques)
+        assert decode_puzzle(b"pad" + record, 3) == (puzzle_size, cliques, 3 + len(record))
+
+
+def test_negative_targets_and_givens_survive():
+    cliques = [(((1, 1), (2, 1)), "-", -1), (((1, 2),), ".", 2), (((2, 2),), ".", 1)]
+    assert decode_puzzle(encode_puzzle(2, cliques), 0)[:2] == (2, cliques)
+
+
+def test_encode_rejects_boards_too_large():
+    with pytest.raises(ValueError):
+        encode_puzzle(256, [])
+
+
+def test_reader_random_access(tmp_path):
+    stored = puzzles(4, 5) + puzzles(6, 5)
+    path = str(tmp_path / "corpus.bin")
+    assert write_corpus(path, stored) == len(stored)
+    with CorpusReader(path) as reader:
+        assert len(reader) == len(stored)
+        assert reader[7] == stored[7]
+        assert reader[-1] == stored[-1]
+        assert list(reader) == stored
+        assert reader.solution(0) is None
+        with pytest.raises(IndexError):
+            reader[len(stored)]
+
+
+def test_solutions_are_stored(tmp_path):
+    stored = puzzles(5, 4)
+    answers = [solve(size, list(cliques), "Forward Checking") for size, cliques in stored]
+    path = str(tmp_path / "corpus.bin")
+    write_corpus(path, stored, answers)
+    with CorpusReader(path) as reader:
+        for i, (_, cliques) in enumerate(stored):
+            solution = reader.solution(i)
+            # solve may reorder the members of a clique, so compare cell by cell
+            assert set(solution) == set(members for members, _, _ in cliques)
+            assert grid(solution) == grid(answers[i])
+
+
+def test_text_round_trip(tmp_path):
+    stored = puzzles(5, 3)
+    path = str(tmp_path / "corpus.bin")
+    text = [line for size, cliques in stored for line in [str(size)] + [str(c) for c in cliques]]
+    assert from_text(text, path) == len(stored)
+    assert list(to_text(path)) == text
+
+
+def test_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        CorpusReader(str(path))
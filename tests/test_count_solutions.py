@@ -0,0 +1,60 @@
+"""Tests of csp.count_solutions against brute-force enumeration."""
+from itertools import permutations
+
+import pytest
+
+import csp
+from Kenken import Kenken, INFERENCES
+from generator import PuzzleGenerator
+
+
+def latin_squares(size):
+    """Every latin square of the size, as {(x, y): value}."""
+    rows = list(permutations(range(1, size + 1)))
+
+    def extend(square):
+        if len(square) == size:
+            yield {(x + 1, y + 1): square[y][x] for y in range(size) for x in range(size)}
+            return
+        for row in rows:
+            if all(row[x] != other[x] for other in square for x in range(size)):
+                yield from extend(square + [row])
+
+    return extend([])
+
+
+def brute_force(size, ken):
+    return sum(all(tuple(square[m] for m in members) in ken.domains[members]
+                   for members in ken.variables)
+               for square in latin_squares(size))
+
+
+# large cages leave most of these puzzles with several solutions
+@pytest.mark.parametrize("size, seed", [(3, 5), (3, 22), (4, 1), (4, 4), (4, 7), (4, 8)])
+@pytest.mark.parametrize("algorithm", ["Backtracking", "Forward Checking", "Arc Consistency"])
+def test_counts_match_enumeration(size, seed, algorithm):
+    _, cliques = PuzzleGenerator(size, seed=seed, max_cage=6, unique=False).puzzle()
+    ken = Kenken(size, list(cliques))
+    expected = brute_force(size, ken)
+    count = csp.count_solutions(ken, inference=INFERENCES[algorithm])
+    assert count.solutions == expected
+    assert count.exhausted
+    assert ken.domain_listener is None
+
+
+def test_limit_stops_early():
+    # a 4x4 board of four-cell '+' cages has several solutions
+    cliques = [(tuple((x, y) for x in range(1, 5)), "+", 10) for y in range(1, 5)]
+    ken = Kenken(4, list(cliques))
+    total = csp.count_solutions(ken)
+    assert total.solutions == 576
+    limited = csp.count_solutions(Kenken(4, list(cliques)), limit=2)
+    assert limited.solutions == 2
+    assert not limited.exhausted
+    assert limited.nodes < total.nodes
+
+
+def test_unique_puzzle_counts_one():
+    size, cliques = PuzzleGenerator(5, seed=4).puzzle()
+    count = csp.count_solutions(Kenken(size, list(cliques)), limit=2)
+    assert (count.solutions, count.exhausted) == (1, True)
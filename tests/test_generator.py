@@ -0,0 +1,35 @@
+"""Tests of the unique-solution puzzle generator."""
+import pytest
+
+import csp
+from Kenken import Kenken, validate
+from generator import PuzzleGenerator
+
+
+def solutions(size, cliques):
+    return csp.count_solutions(Kenken(size, list(cliques)), limit=2).solutions
+
+
+@pytest.mark.parametrize("size", [3, 4, 5, 6])
+@pytest.mark.parametrize("max_repairs", [None, 1, 0])
+def test_puzzles_are_valid_and_unique(size, max_repairs):
+    generator = PuzzleGenerator(size, seed=size, max_repairs=max_repairs)
+    for _ in range(5):
+        puzzle_size, cliques = generator.puzzle()
+        assert puzzle_size == size
+        validate(size, list(cliques))
+        assert solutions(size, cliques) == 1
+
+
+def test_repairs_fall_back_to_givens_past_the_cap():
+    generator = PuzzleGenerator(6, seed=2, max_repairs=0)
+    for _ in range(10):
+        generator.puzzle()
+    assert generator.repairs == 0
+    assert generator.fallbacks > 0
+
+
+def test_same_seed_same_stream():
+    first = PuzzleGenerator(5, seed=11)
+    second = PuzzleGenerator(5, seed=11)
+    assert [first.puzzle() for _ in range(5)] == [second.puzzle() for _ in range(5)]
@@ -0,0 +1,58 @@
+"""Tests of the puzzle text parser."""
+import random
+
+import pytest
+
+from Kenken import generate, validate
+from parsing import PuzzleParseError, PuzzleValidationError, iter_puzzles, parse_cage, parse_puzzle
+
+
+@pytest.mark.parametrize("text, cage", [
+    ("(((1, 1), (1, 2)), '+', 11)", (((1, 1), (1, 2)), "+", 11)),
+    ("(((2, 3),), '.', 4)", (((2, 3),), ".", 4)),
+    ('( ( (1,1) , (2,1) , ) , "-" , -1 )', (((1, 1), (2, 1)), "-", -1)),
+])
+def test_parse_cage_accepts(text, cage):
+    assert parse_cage(text) == cage
+
+
+@pytest.mark.parametrize("text", [
+    "(((1, 1) (1, 2)), '+', 3)",     # no comma between the cells
+    "(((1, 1),, (1, 2)), '+', 3)",
+    "((), '+', 3)",
+    "(((1, 1), (1, 2)), '%', 3)",
+    "(((1, 1), (1, 2)), '+', 3",
+    "(((1, 1), (1, 2)), '+', 3) x",
+    "(((1, 1), (1, 2)), +, 3)",
+    "(((1, 1), (1, 2)), '+\", 3)",
+    "__import__('os').system('true')",
+])
+def test_parse_cage_rejects(text):
+    with pytest.raises(PuzzleParseError):
+        parse_cage(text)
+
+
+def test_generated_puzzles_round_trip_through_text():
+    random.seed(7)
+    puzzles = [generate(size) for size in (3, 4, 5, 6)]
+    text = "\n".join(str(size) + "\n" + "\n".join(str(c) for c in cliques) for size, cliques in puzzles)
+    assert list(iter_puzzles(text)) == [(size, list(cliques)) for size, cliques in puzzles]
+
+
+def test_errors_name_the_line():
+    with pytest.raises(PuzzleParseError) as error:
+        parse_puzzle("3\n(((1, 1), (1, 2)), '+', 3)\n# comment\n(((1, 3) (2, 3)), '+', 3)\n")
+    assert error.value.line_number == 4
+
+
+@pytest.mark.parametrize("text", ["", "(((1, 1),), '.', 1)\n", "3\n2\n", "0\n", "three\n"])
+def test_parse_puzzle_rejects(text):
+    with pytest.raises(PuzzleParseError):
+        parse_puzzle(text)
+
+
+def test_validate_raises_instead_of_exiting():
+    with pytest.raises(PuzzleValidationError) as error:
+        validate(2, [(((1, 1), (1, 2)), "+", 3), (((2, 1), (3, 2)), "+", 3)])
+    assert error.value.code == 2
+    assert error.value.cells == [(3, 2)]
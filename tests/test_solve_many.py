@@ -0,0 +1,43 @@
+"""Tests of the solve_many batch API."""
+from Kenken import Kenken
+from generator import PuzzleGenerator
+from parallel import solve_many
+
+
+def solved(size, cliques, solution):
+    ken = Kenken(size, list(cliques))
+    return solution is not None and ken.goal_test(solution)
+
+
+def test_statuses():
+    size, cliques = PuzzleGenerator(4, seed=1).puzzle()
+    unsolvable = [(((1, 1),), ".", 1), (((2, 1),), ".", 1), (((1, 2), (2, 2)), "+", 3)]
+    malformed = [(((1, 1), (1, 2)), "+", 3)]
+    answers = {puzzle_id: (solution, stats) for puzzle_id, solution, stats in solve_many(
+        [("ok", size, cliques), ("unsolvable", 2, unsolvable), ("malformed", 2, malformed)],
+        workers=2)}
+    solution, stats = answers["ok"]
+    assert stats["status"] == "solved" and solved(size, cliques, solution)
+    assert answers["unsolvable"][1]["status"] == "failed"
+    assert answers["unsolvable"][0] is None
+    assert answers["malformed"][1]["status"].startswith("error: ")
+    assert answers["malformed"][0] is None
+
+
+def test_timeout():
+    size, cliques = PuzzleGenerator(9, seed=1, unique=False).puzzle()
+    [(_, solution, stats)] = solve_many([(size, cliques)], algorithm="Backtracking",
+                                        workers=1, timeout=1e-9)
+    assert stats["status"] == "timeout"
+    assert solution is None
+
+
+def test_ordered_ids_and_bounded_submission():
+    generator = PuzzleGenerator(5, seed=2, unique=False)
+    puzzles = [generator.puzzle() for _ in range(12)]
+    answers = list(solve_many(iter(puzzles), workers=2, chunksize=3, max_pending=1))
+    assert [puzzle_id for puzzle_id, _, _ in answers] == list(range(12))
+    assert all(solved(size, cliques, solution)
+               for (size, cliques), (_, solution, _) in zip(puzzles, answers))
+    unordered = solve_many(puzzles, workers=2, chunksize=2, ordered=False)
+    assert sorted(puzzle_id for puzzle_id, _, _ in unordered) == list(range(12))
@@ -38,16 +38,31 @@ identity = lambda x: x
 argmin = min
 
 
-def argmin_random_tie(seq, key=identity):
-    """Return a minimum element of seq; break ties at random."""
-    return argmin(shuffled(seq), key=key)
+def argmin_random_tie(seq, key=identity, rng=None):
+    """Return a minimum element of seq; break ties at random.
+    Pass a random.Random instance as rng for reproducible tie-breaking."""
+    return argmin(shuffled(seq, rng), key=key)
 
 
 
-def shuffled(iterable):
-    """Randomly shuffle a copy of iterable."""
+def shuffled(iterable, rng=None):
+    """Randomly shuffle a copy of iterable, using rng when given."""
     items = list(iterable)
-    random.shuffle(items)
+    (rng or random).shuffle(items)
     return items
 
 
+
+
+def luby(i):
+    """Return the i-th term (from 1) of the Luby sequence 1 1 2 1 1 2 4 1 1 2 ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while True:
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1